@@ -11,8 +11,11 @@ Usage: rcaptcha.py [OPTIONS] COMMAND [ARGS]...
 Options:
   --help  Show this message and exit.
 Commands:
-  next      With your input as a circular list of...
-  opposite  With your input as a circular list of...
+  all-offsets  Checksums for many steps ahead at once.
+  batch        Checksum a file of numbers, one per line.
+  multi        Several checksums in one pass over the digits.
+  next         With your input as a circular list of...
+  opposite     With your input as a circular list of...
 ```
 
 To get the answers for the two problems:
@@ -21,15 +24,85 @@ To get the answers for the two problems:
 $ ./rcaptcha.py next $(cat input)
 $ ./rcaptcha.py opposite $(cat input)
 ```
+
+Inputs too long for the command line can be streamed from a file, or from
+stdin with `-`:
+
+```bash
+$ ./rcaptcha.py next --file input
+$ ./rcaptcha.py opposite --file - < input
+```
+
+Files compressed with gzip, bzip2 or xz are decompressed on the fly.
 """
+import bz2
+import collections
+import concurrent.futures
+import contextlib
+import functools
+import gzip
+import io
+import itertools
+import lzma
+import math
+import mmap
 import operator
+import os
+import queue
+import shutil
+import stat
+import tempfile
+import threading
 import typing as t
 
 import click
+import numpy as np
 
 
 head = operator.itemgetter(0)
 
+# Digits are read from files in chunks of this many bytes.
+CHUNK_SIZE = 64 * 1024
+
+# Numbers are handed to batch workers this many at a time.
+BATCH_SIZE = 10000
+
+# Buffers of digits are compared this many bytes at a time.
+BLOCK_SIZE = 1024 * 1024
+
+# Decompressed chunks waiting to be checksummed, per reader thread.
+READ_AHEAD = 8
+
+_WHITESPACE = b' \t\r\n\x0b\x0c'
+_ZERO = ord('0')
+# Translation table sending equal bytes (XOR of 0) to 0xff, all others to 0.
+_EQUAL_MASK = bytes([0xff] + [0] * 255)
+
+DigitChunks = t.Iterator[bytes]
+DigitSource = t.Callable[[], DigitChunks]
+Checksum = t.TypeVar('Checksum')
+PendingBatch = concurrent.futures.Future
+Buffer = t.Union[bytes, bytearray, memoryview, mmap.mmap]
+# 'next', 'opposite', or a fixed number of steps ahead.
+Variant = t.Union[str, int]
+Decompressor = t.Callable[[t.BinaryIO], t.BinaryIO]
+
+
+def _reader(open_compressed: t.Callable[..., t.Any]) -> Decompressor:
+    """A Decompressor from one of the gzip/bz2/lzma `open` functions."""
+    def decompressor(compressed: t.BinaryIO) -> t.BinaryIO:
+        return t.cast(t.BinaryIO, open_compressed(compressed, 'rb'))
+    return decompressor
+
+
+# Magic bytes at the start of compressed files.
+DECOMPRESSORS = [
+    (b'\x1f\x8b', _reader(gzip.open)),
+    (b'BZh', _reader(bz2.open)),
+    (b'\xfd7zXZ\x00', _reader(lzma.open)),
+]  # type: t.List[t.Tuple[bytes, Decompressor]]
+_MAGIC_LENGTH = max(len(magic) for magic, _ in DECOMPRESSORS)
+
 
 def _pair_is_equal(digit_pair: t.Tuple[int, int]) -> bool:
     """Check if a pair of digits match."""
@@ -96,32 +169,965 @@ def checksum_opposite(input_value: int) -> int:
     return checksum(len(str(input_value)) // 2, input_value)
 
 
+# ==== Many numbers at once
+CHECKSUMS = {
+    'next': checksum_next,
+    'opposite': checksum_opposite,
+}  # type: t.Dict[str, t.Callable[[int], int]]
+
+
+def _checksum_batch(variant: str,
+                    lines: t.List[t.Tuple[int, str]]) -> t.List[int]:
+    """Checksum one batch of (line number, number) lines, in a worker
+    process.
+
+    raises:
+      ValueError: naming the first line that isn't a non-negative number.
+    """
+    checksum_number = CHECKSUMS[variant]
+    checksums = []
+    for line_number, line in lines:
+        try:
+            checksums.append(checksum_number(int(line)))
+        except ValueError:
+            msg = "Line {} isn't a non-negative number: {!r}"
+            raise ValueError(msg.format(line_number, line.strip()))
+    return checksums
+
+
+def batch_checksums(variant: str, lines: t.Iterable[str],
+                    workers: t.Optional[int] = None,
+                    batch_size: int = BATCH_SIZE) -> t.Iterator[int]:
+    """Checksum many numbers, one per line, over a pool of processes.
+
+    Results come back in the same order as the lines, skipping blank ones.
+    Only a couple of batches per worker are in flight at once, so the input
+    is never read in full.
+
+    raises:
+      ValueError: if a line isn't a non-negative number.
+    """
+    workers = workers or os.cpu_count() or 1
+    numbered = ((line_number, line)
+                for line_number, line in enumerate(lines, start=1)
+                if line.strip())
+    batches = iter(lambda: list(itertools.islice(numbered, batch_size)), [])
+
+    with concurrent.futures.ProcessPoolExecutor(workers) as pool:
+        pending = collections.deque()  # type: t.Deque[PendingBatch]
+        for batch in batches:
+            pending.append(pool.submit(_checksum_batch, variant, batch))
+            if len(pending) >= 2 * workers:
+                yield from pending.popleft().result()
+
+        while pending:
+            yield from pending.popleft().result()
+
+
+# ==== Every offset at once
+def digit_array(input_value: int) -> np.ndarray:
+    """Turn a number into an array of its digits.
+
+    raises:
+      ValueError: if input is negative.
+    """
+    if input_value < 0:
+        raise ValueError("Can't checksum a negative value.")
+    return _ascii_to_digits(str(input_value).encode('ascii'))
+
+
+def _ascii_to_digits(digit_characters: bytes) -> np.ndarray:
+    """The digits in a string of ASCII digit characters."""
+    return np.frombuffer(digit_characters, dtype=np.uint8) - _ZERO
+
+
+def _match_spectrum(digits: np.ndarray, size: int) -> np.ndarray:
+    """Power spectrum of where each digit value occurs, weighted by value.
+
+    Its inverse FFT is the sum of matching digits for each distance apart.
+    """
+    # Zeros never add anything to the checksum, so skip them.
+    spectrum = np.zeros(size // 2 + 1)
+    for value in range(1, 10):
+        occurrences = np.fft.rfft(digits == value, n=size)
+        spectrum += value * np.abs(occurrences) ** 2
+    return spectrum
+
+
+def _linear_pair_sums(digits: np.ndarray) -> np.ndarray:
+    """Sum of digits matching the digit `lag` ahead, for every lag, without
+    wrapping around the end of the list."""
+    length = len(digits)
+    # Pad so the correlation doesn't wrap, to a power of two - FFTs of other
+    # sizes can be a great deal slower.
+    size = 1 << (2 * length - 1).bit_length()
+    correlation = np.fft.irfft(_match_spectrum(digits, size), n=size)
+    return np.rint(correlation[:length]).astype(np.int64)
+
+
+def offset_checksums(digits: np.ndarray) -> np.ndarray:
+    """Santa-checksum of `digits` for every number of steps ahead.
+
+    Element `s` of the result is the checksum `s` steps ahead. For each digit
+    value we correlate where it occurs with itself, using FFTs, so this is
+    O(N log N) rather than O(N^2) for N digits.
+    """
+    length = len(digits)
+    if length <= 1:
+        return np.zeros(length, dtype=np.int64)
+
+    # Pairs `s` apart, plus those wrapping round the end, `N - s` apart.
+    pair_sums = _linear_pair_sums(digits)
+    pair_sums[1:] += pair_sums[:0:-1]
+    return pair_sums
+
+
+def lag_pair_sums(digits: np.ndarray, lags_from: int,
+                  count: int) -> np.ndarray:
+    """Sum of digits matching the digit `lag` ahead, without wrapping around,
+    for `count` lags from `lags_from`."""
+    sums = np.zeros(count, dtype=np.int64)
+    lags_to = min(lags_from + count, len(digits))
+    if lags_from < lags_to:
+        sums[:lags_to - lags_from] = _linear_pair_sums(digits)[
+            lags_from:lags_to]
+    return sums
+
+
+def checksum_all_offsets(
+        input_value: int,
+        shifts: t.Optional[t.Iterable[int]] = None) -> np.ndarray:
+    """Santa-checksum for many `steps_ahead` at once.
+
+    By default computes the checksums 1 to N-1 steps ahead, for N digits,
+    otherwise the checksum for each of `shifts`.
+
+    raises:
+      ValueError: if input is negative.
+    """
+    return _select_shifts(offset_checksums(digit_array(input_value)), shifts)
+
+
+def _select_shifts(checksums: np.ndarray,
+                   shifts: t.Optional[t.Iterable[int]]) -> np.ndarray:
+    """Pick out the checksums for `shifts`, wrapping them around the list."""
+    if shifts is None:
+        return checksums[1:]
+
+    shifts = np.fromiter(shifts, dtype=np.int64)
+    if len(checksums) <= 1:
+        return np.zeros(len(shifts), dtype=np.int64)
+    return checksums[shifts % len(checksums)]
+
+
+# ==== Streaming from files
+def _digits_only(chunks: t.Iterable[bytes]) -> DigitChunks:
+    """Check that chunks of a file are digits, dropping trailing whitespace.
+
+    raises:
+      ValueError: if anything but whitespace follows the digits.
+    """
+    trailing = False
+    for chunk in chunks:
+        digits = chunk.rstrip(_WHITESPACE)
+        if digits and (trailing or not digits.isdigit()):
+            raise ValueError("Can only checksum a file of digits.")
+        if len(digits) < len(chunk):
+            trailing = True
+        if digits:
+            yield digits
+
+
+def _read_chunks(digit_file: t.BinaryIO, start: int,
+                 size: t.Optional[int] = None) -> DigitChunks:
+    """Read a file from `start` onwards, `size` (or CHUNK_SIZE) at a time.
+
+    Seeks before every read, so that several readers can share the file.
+    """
+    size = size or CHUNK_SIZE
+    position = start
+    while True:
+        digit_file.seek(position)
+        chunk = digit_file.read(size)
+        if not chunk:
+            return
+        position += len(chunk)
+        yield chunk
+
+
+def _seekable(digit_file: t.BinaryIO) -> t.BinaryIO:
+    """Spool pipes, like stdin, to a temporary file we can seek around in."""
+    if digit_file.seekable():
+        return digit_file
+
+    spool = tempfile.TemporaryFile()
+    shutil.copyfileobj(digit_file, spool, CHUNK_SIZE)
+    spool.seek(0)
+    return t.cast(t.BinaryIO, spool)
+
+
+def compression(digit_file: t.BinaryIO) -> t.Optional[Decompressor]:
+    """How to decompress a file, by its magic bytes, or None if it isn't."""
+    if digit_file.seekable():
+        start = digit_file.tell()
+        magic = digit_file.read(_MAGIC_LENGTH)
+        digit_file.seek(start)
+    else:
+        # Pipes can't be rewound, but buffered ones let us peek.
+        peek = getattr(digit_file, 'peek', lambda size: b'')
+        magic = peek(_MAGIC_LENGTH)
+
+    for prefix, decompressor in DECOMPRESSORS:
+        if magic.startswith(prefix):
+            return decompressor
+    return None
+
+
+class _PositionalReader(io.RawIOBase):
+    """Reads a file from a position of its own.
+
+    Several readers, in several threads, can share the same file.
+    """
+
+    def __init__(self, raw_file: t.BinaryIO, position: int,
+                 lock: threading.Lock) -> None:
+        super().__init__()
+        self._raw_file = raw_file
+        self._position = position
+        self._lock = lock
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer: t.Any) -> int:
+        with self._lock:
+            self._raw_file.seek(self._position)
+            size = self._raw_file.readinto(buffer)  # type: ignore
+        self._position += size
+        return size
+
+
+def _decompressed(decompressor: Decompressor,
+                  compressed: t.BinaryIO) -> DigitChunks:
+    """Decompress a file chunk by chunk."""
+    with decompressor(compressed) as stream:
+        yield from iter(lambda: stream.read(CHUNK_SIZE), b'')
+
+
+def _read_ahead(chunks: t.Iterable[bytes],
+                depth: int = READ_AHEAD) -> DigitChunks:
+    """Pull chunks from a background thread, a few ahead of the consumer.
+
+    Decompression in the thread overlaps with checksumming. The thread gives
+    up once we stop listening, so it's fine to only read part of the chunks.
+    """
+    pending = queue.Queue(maxsize=depth)  # type: queue.Queue
+    stopped = threading.Event()
+
+    def put(item: t.Tuple[bytes, t.Optional[BaseException]]) -> None:
+        while not stopped.is_set():
+            try:
+                pending.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                pass
+
+    def produce() -> None:
+        try:
+            for chunk in chunks:
+                put((chunk, None))
+                if stopped.is_set():
+                    return
+            put((b'', None))
+        except Exception as err:
+            put((b'', err))
+
+    reader = threading.Thread(target=produce, daemon=True)
+    reader.start()
+    try:
+        while True:
+            chunk, error = pending.get()
+            if error is not None:
+                raise error
+            if not chunk:
+                return
+            yield chunk
+    finally:
+        stopped.set()
+        reader.join()
+
+
+def read_digits(digit_file: t.BinaryIO) -> DigitChunks:
+    """Read the digits of a file once, through, decompressing if need be.
+
+    raises:
+      ValueError: if the file holds anything but digits.
+    """
+    decompressor = compression(digit_file)
+    if decompressor is None:
+        return _digits_only(iter(lambda: digit_file.read(CHUNK_SIZE), b''))
+    return _digits_only(_read_ahead(_decompressed(decompressor, digit_file)))
+
+
+def file_digit_source(digit_file: t.BinaryIO) -> DigitSource:
+    """Open the digits of a file as many times as we need them.
+
+    Each call of the returned function reads the digits from the start.
+    Compressed files get a decompressor, in its own thread, for every call.
+    """
+    digit_file = _seekable(digit_file)
+    start = digit_file.tell()
+    decompressor = compression(digit_file)
+    lock = threading.Lock()
+
+    def open_digits() -> DigitChunks:
+        if decompressor is None:
+            return _digits_only(_read_chunks(digit_file, start))
+
+        compressed = _PositionalReader(digit_file, start, lock)
+        return _digits_only(_read_ahead(
+            _decompressed(decompressor, t.cast(t.BinaryIO, compressed))))
+
+    return open_digits
+
+
+def _slice_digits(chunks: DigitChunks, start: int, stop: int) -> DigitChunks:
+    """Only the digits in position `start` up to `stop` of a stream."""
+    if start >= stop:
+        return
+
+    position = 0
+    for chunk in chunks:
+        end = position + len(chunk)
+        if end > start:
+            yield chunk[max(start - position, 0):stop - position]
+        if end >= stop:
+            return
+        position = end
+
+
+def _aligned_chunks(*streams: DigitChunks) -> t.Iterator[t.Tuple[bytes, ...]]:
+    """Line streams of digits up against each other, chunk by chunk."""
+    # Can't use next() here, it's one of our commands.
+    pending = [b''] * len(streams)
+    while True:
+        pending = [chunk or b''.join(itertools.islice(stream, 1))
+                   for chunk, stream in zip(pending, streams)]
+        size = min(map(len, pending))
+        if not size:
+            return
+        yield tuple(chunk[:size] for chunk in pending)
+        pending = [chunk[size:] for chunk in pending]
+
+
+def _tally_matches(left_bits: int, right: bytes) -> int:
+    """Sum the digits of a block matching the digit at the same place in
+    `right`, with the block given as a big-endian int of its ASCII digits.
+
+    Works on the whole block at once: XOR finds the equal bytes, which mask
+    out everything else in the block, and then we tally the surviving digits.
+    """
+    size = len(right)
+    differences = left_bits ^ int.from_bytes(right, 'big')
+    equal = differences.to_bytes(size, 'big').translate(_EQUAL_MASK)
+    matches = (left_bits & int.from_bytes(equal, 'big')).to_bytes(size, 'big')
+
+    return sum(value * matches.count(_ZERO + value) for value in range(1, 10))
+
+
+def _sum_matches(left: bytes, right: bytes) -> int:
+    """Sum the digits in `left` matching the digit at the same place in
+    `right`, two blocks of ASCII digits of the same size."""
+    return _tally_matches(int.from_bytes(left, 'big'), right)
+
+
+def count_digits(source: DigitSource) -> int:
+    """How many digits there are in a source."""
+    return sum(map(len, source()))
+
+
+def _stream_matches(shifts: t.Sequence[int], source: DigitSource,
+                    length: int, count: int) -> t.List[int]:
+    """Sum the first `count` digits that match the one each of `shifts` ahead.
+
+    Uses a cursor over the source from the start, and one for each shift
+    which starts that far in, and wraps back to the start once it runs out.
+    Each chunk of the first cursor is only converted once for all shifts.
+    """
+    def ahead(steps_ahead: int) -> DigitChunks:
+        steps_ahead %= length
+        wrapped = itertools.chain(
+            _slice_digits(source(), steps_ahead, length),
+            _slice_digits(source(), 0, steps_ahead))
+        return _slice_digits(wrapped, 0, count)
+
+    behind = _slice_digits(source(), 0, count)
+    totals = [0] * len(shifts)
+    for left, *rights in _aligned_chunks(behind, *map(ahead, shifts)):
+        left_bits = int.from_bytes(left, 'big')
+        for index, right in enumerate(rights):
+            totals[index] += _tally_matches(left_bits, right)
+    return totals
+
+
+def stream_checksum(steps_ahead: int, digit_file: t.BinaryIO) -> int:
+    """Santa-checksum of the digits in a file, or stdin.
+
+    Memory use stays the same however large the file is.
+
+    raises:
+      ValueError: if the file holds anything but digits.
+    """
+    source = file_digit_source(digit_file)
+    length = count_digits(source)
+    if length <= 1:
+        return 0
+
+    return _stream_matches([steps_ahead], source, length, length)[0]
+
+
+def stream_checksum_next(digit_file: t.BinaryIO) -> int:
+    """Run the checksum with values one step ahead in a file of digits.
+
+    Only reads the file once, carrying the last digit of each chunk over to
+    the next one.
+
+    raises:
+      ValueError: if the file holds anything but digits.
+    """
+    first = carry = b''
+    length = acc = 0
+    for chunk in read_digits(digit_file):
+        window = carry + chunk
+        acc += _sum_matches(window[:-1], window[1:])
+        first = first or window[:1]
+        carry = window[-1:]
+        length += len(chunk)
+
+    # A lone digit has no pair, otherwise the last digit wraps round to the
+    # first one.
+    if length <= 1:
+        return 0
+    return acc + _sum_matches(carry, first)
+
+
+def stream_checksum_opposite(digit_file: t.BinaryIO) -> int:
+    """Run the checksum with values halfway ahead in a file of digits.
+
+    raises:
+      ValueError: if the file holds anything but digits.
+    """
+    source = file_digit_source(digit_file)
+    length = count_digits(source)
+    if length <= 1:
+        return 0
+
+    halfway = length // 2
+    if length % 2:
+        return _stream_matches([halfway], source, length, length)[0]
+
+    # Each digit in the first half is paired up with one in the second half,
+    # and the other way round, so we only need to look at one half.
+    return 2 * _stream_matches([halfway], source, length, halfway)[0]
+
+
+def file_digit_array(digit_file: t.BinaryIO) -> np.ndarray:
+    """Read all the digits in a file, or stdin, into an array.
+
+    raises:
+      ValueError: if the file holds anything but digits.
+    """
+    return _ascii_to_digits(b''.join(file_digit_source(digit_file)()))
+
+
+# ==== Straight from a buffer
+# Buffers are only ever sliced - which copies out a bounded block of an mmap
+# - never viewed with memoryview, so no pointers into a mapping outlive an
+# error and stop it closing.
+def _block_digits(block: Buffer) -> bytes:
+    """One block of a buffer as bytes, checking it's all digits.
+
+    raises:
+      ValueError: if the block holds anything but digits.
+    """
+    digits = bytes(block)
+    if not digits.isdigit():
+        raise ValueError("Can only checksum a buffer of digits.")
+    return digits
+
+
+def _buffer_matches(left: Buffer, right: Buffer) -> int:
+    """Sum the digits in `left` matching the digit at the same place in
+    `right`, for two blocks of ASCII digits of the same size.
+
+    raises:
+      ValueError: if the blocks hold anything but digits.
+    """
+    return _sum_matches(_block_digits(left), _block_digits(right))
+
+
+def _block_matches(buffer: Buffer, left: int, right: int, count: int) -> int:
+    """Like _buffer_matches, for the `count` digits from `left` and `right`
+    in a buffer, but a block at a time to bound memory use."""
+    return sum(_buffer_matches(
+        buffer[left + start:left + min(start + BLOCK_SIZE, count)],
+        buffer[right + start:right + min(start + BLOCK_SIZE, count)])
+        for start in range(0, count, BLOCK_SIZE))
+
+
+def _shifted_matches(buffer: Buffer, length: int, steps_ahead: int,
+                     count: int) -> int:
+    """Sum the first `count` of `length` digits in a buffer matching the
+    digit `steps_ahead` ahead.
+
+    Compares the buffer against a shifted run of itself, in two parts: up to
+    where the shifted run goes off the end, and after it has wrapped around.
+    """
+    steps_ahead %= length
+    wrap = length - steps_ahead
+
+    acc = _block_matches(buffer, 0, steps_ahead, min(count, wrap))
+    if count > wrap:
+        acc += _block_matches(buffer, wrap, 0, count - wrap)
+    return acc
+
+
+def _digit_length(buffer: Buffer) -> int:
+    """How many digits a buffer holds, without any trailing whitespace."""
+    length = len(buffer)
+    while length and buffer[length - 1] in _WHITESPACE:
+        length -= 1
+    return length
+
+
+def buffer_checksum(steps_ahead: int, buffer: Buffer) -> int:
+    """Santa-checksum of the ASCII digits in a buffer, e.g. from mmap.
+
+    raises:
+      ValueError: if the buffer holds anything but digits.
+    """
+    length = _digit_length(buffer)
+    if length <= 1:
+        return 0
+    return _shifted_matches(buffer, length, steps_ahead, length)
+
+
+def buffer_checksum_next(buffer: Buffer) -> int:
+    """Run the checksum with values one step ahead in a buffer of digits.
+
+    raises:
+      ValueError: if the buffer holds anything but digits.
+    """
+    return buffer_checksum(1, buffer)
+
+
+def buffer_checksum_opposite(buffer: Buffer) -> int:
+    """Run the checksum with values halfway ahead in a buffer of digits.
+
+    raises:
+      ValueError: if the buffer holds anything but digits.
+    """
+    length = _digit_length(buffer)
+    if length <= 1:
+        return 0
+
+    halfway = length // 2
+    if length % 2:
+        return _shifted_matches(buffer, length, halfway, length)
+
+    # As with streaming, the pairs are symmetric: scan one half, double it.
+    return 2 * _shifted_matches(buffer, length, halfway, halfway)
+
+
+def can_map(digit_file: t.BinaryIO) -> bool:
+    """Is this a regular file on disk, which we can mmap?"""
+    try:
+        return stat.S_ISREG(os.fstat(digit_file.fileno()).st_mode)
+    except (OSError, io.UnsupportedOperation):
+        return False
+
+
+@contextlib.contextmanager
+def mapped_digits(digit_file: t.BinaryIO) -> t.Iterator[Buffer]:
+    """Memory map a file of digits, read-only."""
+    if not os.fstat(digit_file.fileno()).st_size:
+        # Empty files can't be mapped.
+        yield b''
+        return
+
+    with mmap.mmap(digit_file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        yield mapped
+
+
+def _checksum_file(
+        digit_file: t.BinaryIO,
+        from_buffer: t.Callable[[Buffer], Checksum],
+        from_stream: t.Callable[[t.BinaryIO], Checksum]) -> Checksum:
+    """Checksum a file in place if we can map it, otherwise stream it."""
+    if compression(digit_file) is not None or not can_map(digit_file):
+        return from_stream(digit_file)
+
+    with mapped_digits(digit_file) as buffer:
+        return from_buffer(buffer)
+
+
+# ==== Several variants in one pass
+def variant_shift(variant: Variant, length: int) -> int:
+    """How many steps ahead a captcha variant looks, given `length` digits.
+
+    raises:
+      ValueError: for unknown variants.
+    """
+    if variant == 'next':
+        return 1
+    if variant == 'opposite':
+        return length // 2
+    try:
+        return int(variant)
+    except ValueError:
+        raise ValueError("Unknown captcha variant: {}.".format(variant))
+
+
+def _variant_shifts(variants: t.Iterable[Variant],
+                    length: int) -> t.Dict[Variant, int]:
+    """Steps ahead for each variant, wrapped around `length` digits."""
+    return {variant: variant_shift(variant, length) % max(length, 1)
+            for variant in variants}
+
+
+def _wrapped_block(buffer: Buffer, length: int, start: int,
+                   size: int) -> bytes:
+    """`size` of the `length` digits in a buffer, from `start`, wrapping round
+    to the front if need be."""
+    start %= length
+    block = bytes(buffer[start:min(start + size, length)])
+    if len(block) < size:
+        block += bytes(buffer[:size - len(block)])
+    return block
+
+
+def buffer_multi_checksum(variants: t.Iterable[Variant],
+                          buffer: Buffer) -> t.Dict[Variant, int]:
+    """Checksums of a buffer of digits for several variants, in one pass.
+
+    Each block of the buffer is checked and converted once, then compared
+    against the block each variant's steps ahead.
+
+    raises:
+      ValueError: for unknown variants, or if the buffer isn't all digits.
+    """
+    length = _digit_length(buffer)
+    shifts = _variant_shifts(variants, length)
+    if length <= 1:
+        return dict.fromkeys(shifts, 0)
+
+    # Variants can share a shift, e.g. 'next' and 1 - only do those once.
+    totals = dict.fromkeys(shifts.values(), 0)
+    for start in range(0, length, BLOCK_SIZE):
+        block = _block_digits(buffer[start:min(start + BLOCK_SIZE, length)])
+        block_bits = int.from_bytes(block, 'big')
+        for shift in totals:
+            ahead = _wrapped_block(buffer, length, start + shift, len(block))
+            totals[shift] += _tally_matches(block_bits, ahead)
+
+    return {variant: totals[shift] for variant, shift in shifts.items()}
+
+
+def stream_multi_checksum(variants: t.Iterable[Variant],
+                          digit_file: t.BinaryIO) -> t.Dict[Variant, int]:
+    """Checksums of a file of digits, or stdin, for several variants.
+
+    raises:
+      ValueError: for unknown variants, or if the file isn't all digits.
+    """
+    source = file_digit_source(digit_file)
+    length = count_digits(source)
+    shifts = _variant_shifts(variants, length)
+    if length <= 1:
+        return dict.fromkeys(shifts, 0)
+
+    unique_shifts = sorted(set(shifts.values()))
+    totals = _stream_matches(unique_shifts, source, length, length)
+    by_shift = dict(zip(unique_shifts, totals))
+    return {variant: by_shift[shift] for variant, shift in shifts.items()}
+
+
+def multi_checksum(variants: t.Iterable[Variant],
+                   input_value: int) -> t.Dict[Variant, int]:
+    """Checksums of a number for several variants, in one pass.
+
+    raises:
+      ValueError: for unknown variants, or if input is negative.
+    """
+    if input_value < 0:
+        raise ValueError("Can't checksum a negative value.")
+    return buffer_multi_checksum(variants, str(input_value).encode('ascii'))
+
+
+# ==== Growing lists of digits
+class CaptchaAccumulator(object):
+    """Santa-checksums of a list of digits which keeps growing.
+
+    Appending k digits updates the 'next' checksum in O(k): only the pair
+    wrapping around from the last digit to the first changes.
+
+    'opposite' pairs up digits half the length apart, so every append moves
+    all the pairs. We keep the sums of matching pairs for a window of
+    distances from half the current length. Each new digit updates the window
+    in O(window), and once the length outgrows it, it's rebuilt with an FFT.
+    That works out at O(sqrt(N log N)) per digit, rather than O(N).
+    """
+
+    # Smallest window of distances to track for 'opposite'.
+    MIN_WINDOW = 1024
+
+    def __init__(self, digits: t.Union[str, bytes] = b'') -> None:
+        self._digits = np.zeros(self.MIN_WINDOW, dtype=np.uint8)
+        self._length = 0
+        # Sum of digits matching the next one, not counting the wrap-around.
+        self._next_pairs = 0
+        # Sums of matching digits `lag` apart, for lags from `_lags_from`.
+        self._lags_from = 0
+        self._lags = np.zeros(0, dtype=np.int64)
+
+        self.append(digits)
+
+    def __len__(self) -> int:
+        return self._length
+
+    @property
+    def digits(self) -> np.ndarray:
+        """All the digits so far."""
+        return self._digits[:self._length]
+
+    def append(self, digits: t.Union[str, bytes]) -> 'CaptchaAccumulator':
+        """Add digits to the end of the list.
+
+        raises:
+          ValueError: if given anything but digits.
+        """
+        if isinstance(digits, str):
+            digits = digits.encode('ascii')
+        if not digits:
+            return self
+        if not digits.isdigit():
+            raise ValueError("Can only append digits.")
+
+        start, new_digits = self._length, _ascii_to_digits(digits)
+        self._reserve(start + len(new_digits))
+        self._digits[start:start + len(new_digits)] = new_digits
+        self._length += len(new_digits)
+
+        # Pairs between each new digit and the one before it.
+        pairs = self._digits[max(start - 1, 0):self._length]
+        behind, ahead = pairs[:-1], pairs[1:]
+        self._next_pairs += int(behind[behind == ahead].sum())
+
+        if len(new_digits) >= self._window_size(self._length):
+            # Cheaper to start over than to update digit by digit.
+            self._rebuild_lags(self._length)
+        else:
+            for position in range(start, self._length):
+                self._add_lags(position)
+
+        return self
+
+    def value(self, variant: str = 'next') -> int:
+        """The checksum of the digits so far, 'next' or 'opposite'.
+
+        raises:
+          ValueError: for other variants.
+        """
+        length = self._length
+        if length <= 1:
+            return 0
+
+        if variant == 'next':
+            first, last = self._digits[0], self._digits[length - 1]
+            return self._next_pairs + int(last if first == last else 0)
+
+        if variant == 'opposite':
+            halfway = length // 2
+            if length % 2:
+                # Digits before the middle pair up with the one `halfway`
+                # ahead, the ones after wrap round to `halfway + 1` behind.
+                return self._lag(halfway) + self._lag(halfway + 1)
+            return 2 * self._lag(halfway)
+
+        raise ValueError("Unknown captcha variant: {}.".format(variant))
+
+    def _reserve(self, length: int) -> None:
+        """Make room for `length` digits."""
+        if length <= len(self._digits):
+            return
+        grown = np.zeros(max(length, 2 * len(self._digits)), dtype=np.uint8)
+        grown[:self._length] = self.digits
+        self._digits = grown
+
+    def _window_size(self, length: int) -> int:
+        return max(self.MIN_WINDOW, math.isqrt(length * length.bit_length()))
+
+    def _lag(self, lag: int) -> int:
+        return int(self._lags[lag - self._lags_from])
+
+    def _rebuild_lags(self, length: int) -> None:
+        """Pair sums for a fresh window from half of the first `length`
+        digits."""
+        self._lags_from = length // 2
+        self._lags = lag_pair_sums(self._digits[:length], self._lags_from,
+                                   self._window_size(length))
+
+    def _add_lags(self, position: int) -> None:
+        """Count the new digit at `position` into the window of pair sums."""
+        value = self._digits[position]
+        lags_from, lags_to = self._lags_from, self._lags_from + len(self._lags)
+
+        # Earlier digits the window's lags pair this one up with, nearest
+        # (smallest lag) first.
+        nearest = position - lags_from
+        if value and nearest >= 0:
+            furthest = max(position - lags_to + 1, 0)
+            partners = self._digits[furthest:nearest + 1][::-1]
+            self._lags[:len(partners)] += value * (partners == value)
+
+        # The window must cover the lags 'opposite' needs at this length.
+        if (position + 1) // 2 + 1 >= lags_to:
+            self._rebuild_lags(position + 1)
+
+
+def _checksum_input(number: t.Optional[int],
+                    digit_file: t.Optional[t.BinaryIO],
+                    from_number: t.Callable[[int], Checksum],
+                    from_file: t.Callable[[t.BinaryIO], Checksum]) -> Checksum:
+    """Checksum whichever of `number` and `digit_file` was given."""
+    if number is not None and digit_file is None:
+        return from_number(number)
+    if digit_file is not None and number is None:
+        return from_file(digit_file)
+    raise click.UsageError("Give either a NUMBER or a --file.")
+
+
 @click.group()
 def rcaptcha() -> None:
     """Calculate a checksum of your input numbers."""
     pass
 
 
+file_option = click.option(
+    '-f', '--file', 'digit_file', type=click.File('rb'),
+    help="Read the digits from a file, '-' for stdin.")
+
+
+@rcaptcha.command('all-offsets')
+@click.argument('number', type=int, required=False)
+@file_option
+@click.option('-s', '--shift', 'shifts', type=int, multiple=True,
+              help="Steps ahead to checksum, repeat for more. Default: all.")
+def all_offsets(number, digit_file, shifts) -> None:
+    """Checksums for many steps ahead at once.
+
+    Prints the number of steps ahead and the checksum, one per line.
+    """
+    try:
+        checksums = _checksum_input(
+            number, digit_file,
+            lambda number: offset_checksums(digit_array(number)),
+            lambda digit_file: offset_checksums(file_digit_array(digit_file)))
+    except ValueError as err:
+        raise click.BadParameter(str(err))
+
+    shifts = shifts or range(1, len(checksums))
+    for shift, value in zip(shifts, _select_shifts(checksums, shifts)):
+        click.echo("{}\t{}".format(shift, value))
+
+
+@rcaptcha.command()
+@click.argument('numbers', type=click.File())
+@click.option('-v', '--variant', type=click.Choice(sorted(CHECKSUMS)),
+              default='next', show_default=True)
+@click.option('-w', '--workers', type=int,
+              help="Processes to use. Default: one per CPU.")
+@click.option('-o', '--output', type=click.File('w'), default='-',
+              help="Where to write the checksums. Default: stdout.")
+def batch(numbers: t.IO[str], variant: str, workers: t.Optional[int],
+          output: t.IO[str]) -> None:
+    """Checksum a file of numbers, one per line.
+
+    Writes one checksum per line, in the same order as the numbers. Blank
+    lines are skipped.
+    """
+    try:
+        for value in batch_checksums(variant, numbers, workers=workers):
+            output.write("{}\n".format(value))
+    except ValueError as err:
+        raise click.BadParameter(str(err), param_hint='NUMBERS')
+
+
 @rcaptcha.command()
-@click.argument('number', type=int)
-def next(number) -> None:
+@click.argument('number', type=int, required=False)
+@file_option
+@click.option('-v', '--variant', 'variants', multiple=True,
+              default=('next', 'opposite'), show_default=True,
+              help="'next', 'opposite' or steps ahead, repeat for more.")
+def multi(number, digit_file, variants) -> None:
+    """Several checksums in one pass over the digits.
+
+    Prints each variant and its checksum, one per line.
+    """
+    try:
+        checksums = _checksum_input(
+            number, digit_file,
+            functools.partial(multi_checksum, variants),
+            lambda digit_file: _checksum_file(
+                digit_file,
+                functools.partial(buffer_multi_checksum, variants),
+                functools.partial(stream_multi_checksum, variants)))
+    except ValueError as err:
+        raise click.BadParameter(str(err))
+
+    for variant, value in checksums.items():
+        click.echo("{}\t{}".format(variant, value))
+
+
+@rcaptcha.command()
+@click.argument('number', type=int, required=False)
+@file_option
+def next(number, digit_file) -> None:
     """Santa-checksum - one step ahead.
 
     With your input as a circular list of numbers, sum matching values one step
     ahead.
     """
-    click.echo(str(checksum_next(number)))
+    try:
+        checksum = _checksum_input(
+            number, digit_file, checksum_next,
+            lambda digit_file: _checksum_file(
+                digit_file, buffer_checksum_next, stream_checksum_next))
+    except ValueError as err:
+        raise click.BadParameter(str(err))
+
+    click.echo(str(checksum))
 
 
 @rcaptcha.command()
-@click.argument('number', type=int)
-def opposite(number) -> None:
+@click.argument('number', type=int, required=False)
+@file_option
+def opposite(number, digit_file) -> None:
     """Santa-checkum - halfway round the list.
 
     With your input as a circular list of numbers, sum matching values half way
     ahead.
     """
-    click.echo(str(checksum_opposite(number)))
+    try:
+        checksum = _checksum_input(
+            number, digit_file, checksum_opposite,
+            lambda digit_file: _checksum_file(
+                digit_file, buffer_checksum_opposite,
+                stream_checksum_opposite))
+    except ValueError as err:
+        raise click.BadParameter(str(err))
+
+    click.echo(str(checksum))
 
 
 if __name__ == '__main__':
@@ -1,6 +1,17 @@
 #!/usr/bin/env python
 # coding: utf-8
 """Tests for day 1 of the advent of code."""
+import bz2
+import functools
+import gzip
+import io
+import lzma
+import random
+import typing as t
+
+import pytest
+from click.testing import CliRunner
+
 import rcaptcha
 
 
@@ -52,3 +63,210 @@ def test_all_match_halfway_ahead() -> None:
 def test_every_second_matches() -> None:
     """12131415 produces 4."""
     assert rcaptcha.checksum_opposite(12131415) == 4
+
+
+def test_stream_next_matches_number() -> None:
+    """Streaming a file of digits gives the same checksum as the number."""
+    for number in (1122, 1111, 1234, 91212129, 7):
+        digits = io.BytesIO(str(number).encode() + b'\n')
+        assert rcaptcha.stream_checksum_next(digits) == \
+            rcaptcha.checksum_next(number)
+
+
+def test_stream_opposite_matches_number() -> None:
+    """Both even and odd lengths match the in-memory checksum."""
+    for number in (1212, 1221, 123425, 123123, 12131415, 1213141):
+        digits = io.BytesIO(str(number).encode())
+        assert rcaptcha.stream_checksum_opposite(digits) == \
+            rcaptcha.checksum_opposite(number)
+
+
+def test_stream_across_chunks(monkeypatch) -> None:
+    """Pairs spanning chunk boundaries are still counted."""
+    monkeypatch.setattr(rcaptcha, 'CHUNK_SIZE', 3)
+    assert list(rcaptcha._read_chunks(io.BytesIO(b'12345'), 1)) == \
+        [b'234', b'5']
+    number = 9121212991223344
+    for steps_ahead in range(1, 16):
+        digits = io.BytesIO(str(number).encode())
+        assert rcaptcha.stream_checksum(steps_ahead, digits) == \
+            rcaptcha.checksum(steps_ahead, number)
+
+
+def test_stream_rejects_non_digits() -> None:
+    """Only digits, and trailing whitespace, make a valid file."""
+    with pytest.raises(ValueError):
+        rcaptcha.stream_checksum_next(io.BytesIO(b'12 34'))
+
+
+def test_all_offsets_match_checksum() -> None:
+    """Every offset at once agrees with checksumming them one at a time."""
+    number = 91212129912233445566778899001
+    expected = [rcaptcha.checksum(shift, number)
+                for shift in range(1, len(str(number)))]
+    assert list(rcaptcha.checksum_all_offsets(number)) == expected
+
+
+def test_all_offsets_chosen_shifts() -> None:
+    """Shifts wrap around the list, like steps_ahead does."""
+    checksums = rcaptcha.checksum_all_offsets(123425, shifts=[1, 3, 9])
+    assert list(checksums) == [0, 4, 4]
+
+
+def test_batch_keeps_input_order() -> None:
+    """Results come back in the order of the input lines."""
+    numbers = ['1122\n', '1111\n', '1234\n', '91212129\n', '1212\n'] * 3
+    checksums = rcaptcha.batch_checksums('next', numbers, workers=2,
+                                         batch_size=2)
+    assert list(checksums) == [3, 4, 0, 9, 0] * 3
+
+
+def test_batch_blank_and_bad_lines() -> None:
+    """Blank lines are skipped, and bad ones reported by line number."""
+    numbers = ['1122\n', '\n', '1111\n', '  \n']
+    assert list(rcaptcha.batch_checksums('next', numbers, workers=1)) == \
+        [3, 4]
+
+    with pytest.raises(ValueError, match='Line 3'):
+        list(rcaptcha.batch_checksums('next', ['1122\n', '\n', '12a\n'],
+                                      workers=1))
+
+
+def test_buffer_matches_number(monkeypatch) -> None:
+    """Buffers, split over several blocks, agree with the number checksum."""
+    monkeypatch.setattr(rcaptcha, 'BLOCK_SIZE', 4)
+    number = 9121212991223344
+    digits = str(number).encode() + b'\n'
+    for steps_ahead in range(1, 16):
+        assert rcaptcha.buffer_checksum(steps_ahead, digits) == \
+            rcaptcha.checksum(steps_ahead, number)
+    assert rcaptcha.buffer_checksum_next(digits) == \
+        rcaptcha.checksum_next(number)
+    assert rcaptcha.buffer_checksum_opposite(memoryview(digits[:-2])) == \
+        rcaptcha.checksum_opposite(number // 10)
+
+
+def test_mapped_file(tmp_path) -> None:
+    """Files on disk are checksummed straight from memory mapped pages."""
+    path = tmp_path / 'digits'
+    path.write_bytes(b'12131415\n')
+    with path.open('rb') as digit_file, \
+            rcaptcha.mapped_digits(digit_file) as buffer:
+        assert rcaptcha.buffer_checksum_opposite(buffer) == 4
+
+
+def test_buffer_rejects_non_digits() -> None:
+    """Only digits, and trailing whitespace, make a valid buffer."""
+    with pytest.raises(ValueError):
+        rcaptcha.buffer_checksum_next(b'-1234')
+
+
+def test_mapped_file_rejects_non_digits(tmp_path) -> None:
+    """A bad digit in a mapped file is reported, and the mapping closes."""
+    path = tmp_path / 'digits'
+    path.write_bytes(b'12a34\n')
+    for checksum in (rcaptcha.buffer_checksum_next,
+                     rcaptcha.buffer_checksum_opposite,
+                     functools.partial(rcaptcha.buffer_multi_checksum,
+                                       ['next', 2])):
+        with path.open('rb') as digit_file, pytest.raises(ValueError):
+            rcaptcha._checksum_file(digit_file, checksum,
+                                    rcaptcha.stream_checksum_next)
+
+    for command in ('multi', 'next', 'opposite', 'all-offsets'):
+        result = CliRunner().invoke(rcaptcha.rcaptcha,
+                                    [command, '--file', str(path)])
+        assert result.exit_code == 2
+        assert "digits" in result.output
+
+
+@pytest.mark.parametrize('command', ['next', 'opposite', 'all-offsets'])
+def test_cli_rejects_non_digits_piped(command: str) -> None:
+    """Bad digits on stdin are a usage error, not a traceback."""
+    result = CliRunner().invoke(rcaptcha.rcaptcha, [command, '--file', '-'],
+                                input=b'12a34')
+    assert result.exit_code == 2
+    assert "digits" in result.output
+
+
+def test_multi_checksum() -> None:
+    """Several variants at once agree with checksumming them one by one."""
+    number = 9121212991223344
+    checksums = rcaptcha.multi_checksum(['next', 'opposite', 3, '5'], number)
+    assert checksums == {
+        'next': rcaptcha.checksum_next(number),
+        'opposite': rcaptcha.checksum_opposite(number),
+        3: rcaptcha.checksum(3, number),
+        '5': rcaptcha.checksum(5, number),
+    }
+
+
+def test_multi_checksum_blocks_and_streams(monkeypatch) -> None:
+    """Buffers over many blocks, and streams, give the same answers."""
+    monkeypatch.setattr(rcaptcha, 'BLOCK_SIZE', 3)
+    monkeypatch.setattr(rcaptcha, 'CHUNK_SIZE', 4)
+    number = 1213141512131415999
+    variants: t.List[rcaptcha.Variant] = ['next', 'opposite', 1, 7, 18]
+    expected = rcaptcha.multi_checksum(variants, number)
+    assert expected['opposite'] == rcaptcha.checksum_opposite(number)
+    assert expected[7] == rcaptcha.checksum(7, number)
+    digits = io.BytesIO(str(number).encode() + b'\n')
+    assert rcaptcha.stream_multi_checksum(variants, digits) == expected
+
+
+def test_multi_checksum_unknown_variant() -> None:
+    """Variants are next, opposite or a number of steps."""
+    with pytest.raises(ValueError):
+        rcaptcha.multi_checksum(['sideways'], 1234)
+
+
+def test_accumulator_tracks_checksums(monkeypatch) -> None:
+    """Appending bit by bit keeps both checksums up to date."""
+    monkeypatch.setattr(rcaptcha.CaptchaAccumulator, 'MIN_WINDOW', 4)
+    rng = random.Random(2017)
+    accumulator = rcaptcha.CaptchaAccumulator('1')
+    digits = '1'
+    for _ in range(60):
+        size = rng.choice([1, 1, 2, 3, 9])
+        more = ''.join(rng.choice('1223') for _ in range(size))
+        accumulator.append(more)
+        digits += more
+        assert accumulator.value('next') == rcaptcha.checksum_next(
+            int(digits))
+        assert accumulator.value('opposite') == rcaptcha.checksum_opposite(
+            int(digits))
+
+
+def test_accumulator_short_lists() -> None:
+    """Nothing to pair up with no digits, or only one."""
+    accumulator = rcaptcha.CaptchaAccumulator()
+    assert accumulator.value('opposite') == 0
+    assert accumulator.append('7').value() == 0
+    assert accumulator.append('7').value() == 14
+    with pytest.raises(ValueError):
+        accumulator.append('7a')
+
+
+class Pipe(io.BytesIO):
+    """Like stdin from a pipe, can't be rewound."""
+
+    def seekable(self) -> bool:
+        return False
+
+
+@pytest.mark.parametrize('compress', [gzip.compress, bz2.compress,
+                                      lzma.compress])
+def test_compressed_input(monkeypatch, compress) -> None:
+    """Compressed files and pipes are checksummed like plain ones."""
+    monkeypatch.setattr(rcaptcha, 'CHUNK_SIZE', 3)
+    number = 1213141512131415999
+    compressed = compress(str(number).encode() + b'\n')
+
+    assert rcaptcha.stream_checksum_next(io.BytesIO(compressed)) == \
+        rcaptcha.checksum_next(number)
+    assert rcaptcha.stream_checksum_next(io.BufferedReader(
+        Pipe(compressed))) == rcaptcha.checksum_next(number)
+    assert rcaptcha.stream_checksum_opposite(Pipe(compressed)) == \
+        rcaptcha.checksum_opposite(number)
+    assert rcaptcha.stream_multi_checksum([2, 9], io.BytesIO(compressed)) == \
+        rcaptcha.multi_checksum([2, 9], number)
@@ -1,10 +1,18 @@
 #!/usr/bin/env python
 # coding: utf-8
 """Day 2 of the advent of code challenges."""
+import array
+import concurrent.futures
+import hashlib
 import itertools
+import mmap
+import os
+import struct
+import tempfile
 import typing as t
 
 import click
+import numpy as np
 
 
 # This is a bit awkward actually, but satisfies mypy.
@@ -40,13 +48,22 @@ def spreadsheet_to_numbers(lines: t.Iterable[str]) -> t.List[t.List[int]]:
     return list(map(line_to_numbers, lines))
 
 
+def rows_of(spreadsheet: t.Iterable[str]) -> t.Iterator[t.List[int]]:
+    """Parse a spreadsheet lazily, one row at a time.
+
+    raises:
+      ValueError
+    """
+    return map(line_to_numbers, spreadsheet)
+
+
 # ==== Part 1 ====
 def diff_row_checksum(row: t.List[int]) -> int:
     """Calculate the first checksum of a spreadsheet row."""
     return max(row) - min(row)
 
 
-def diff_checksum_of_rows(rows: t.List[t.List[int]]) -> int:
+def diff_checksum_of_rows(rows: t.Iterable[t.List[int]]) -> int:
     """Checksum a spreadsheet's numeric rows."""
     return sum(map(diff_row_checksum, rows))
 
@@ -57,13 +74,21 @@ def difference_checksum(spreadsheet: t.IO[str]) -> int:
     raises:
       ValueError
     """
-    rows = spreadsheet_to_numbers(spreadsheet.readlines())
-    return diff_checksum_of_rows(rows)
+    return diff_checksum_of_rows(rows_of(spreadsheet))
 
 
 # ==== Part 2 ====
-def divisors(row: t.List[int]) -> t.Tuple[int, ...]:
-    """Find the first evenly divisible pair in a spreadsheet row.
+# Rows at least this wide, with values no larger than SIEVE_LIMIT, are searched
+# with a bitmap of their values.
+SIEVE_MIN_WIDTH = 64
+SIEVE_LIMIT = 1 << 22
+
+
+def pairwise_divisors(row: t.List[int]) -> t.Tuple[int, ...]:
+    """Find the first evenly divisible pair, trying every pair in the row.
+
+    O(n^2) - the reference the faster searches are checked against, and what
+    rows with zero or negative numbers fall back to.
 
     raises:
       NoDivisorsFound
@@ -85,17 +110,137 @@ def divisors(row: t.List[int]) -> t.Tuple[int, ...]:
     return divisors[0]
 
 
-def divisor_checksum_of_rows(rows: t.List[t.List[int]]) -> int:
+def sorted_divisors(row: t.List[int]) -> t.Tuple[int, ...]:
+    """Find the evenly divisible pair with the smallest divisor.
+
+    Goes through the row from the smallest value up, stopping at the first
+    match. For each divisor, either checks the larger values in the row, or
+    its multiples up to the largest value - whichever there are fewer of.
+    Rows must be all positive numbers.
+
+    raises:
+      NoDivisorsFound
+      TooFewValuesInLine
+    """
+    if len(row) < 2:
+        raise TooFewValuesInLine("Must have two numbers at least in a row.")
+
+    values = sorted(row)
+    value_set = set(values)
+    largest = values[-1]
+    for index, divisor in enumerate(values[:-1]):
+        if values[index + 1] == divisor:
+            return divisor, divisor
+
+        larger_values = len(values) - index - 1
+        if largest // divisor < larger_values:
+            for multiple in range(2 * divisor, largest + 1, divisor):
+                if multiple in value_set:
+                    return multiple, divisor
+        else:
+            for multiple in itertools.islice(values, index + 1, None):
+                if multiple % divisor == 0:
+                    return multiple, divisor
+
+    raise NoDivisorsFound("No evenly dividable numbers in the line.")
+
+
+def sieve_divisors(row: t.List[int]) -> t.Tuple[int, ...]:
+    """Find the evenly divisible pair with the smallest divisor.
+
+    Marks every value in a bitmap, then for each divisor looks for a marked
+    multiple by slicing the bitmap with the divisor as the step. That's
+    O(max log max) bytes scanned, for rows of positive values up to max.
+
+    raises:
+      NoDivisorsFound
+      TooFewValuesInLine
+    """
+    if len(row) < 2:
+        raise TooFewValuesInLine("Must have two numbers at least in a row.")
+
+    present = bytearray(max(row) + 1)
+    repeated = None  # type: t.Optional[int]
+    for value in row:
+        if present[value] and (repeated is None or value < repeated):
+            repeated = value
+        present[value] = 1
+
+    for divisor in sorted(set(row)):
+        if divisor == repeated:
+            return divisor, divisor
+
+        offset = present[2 * divisor::divisor].find(1)
+        if offset >= 0:
+            return (offset + 2) * divisor, divisor
+
+    raise NoDivisorsFound("No evenly dividable numbers in the line.")
+
+
+def smallest_pairwise_divisors(row: t.List[int]) -> t.Tuple[int, ...]:
+    """Find the evenly divisible pair with the smallest divisor, then the
+    smallest dividend, by testing every pair - for rows with numbers that
+    aren't positive. Zero never divides.
+
+    raises:
+      NoDivisorsFound
+      TooFewValuesInLine
+    """
+    if len(row) < 2:
+        raise TooFewValuesInLine("Must have two numbers at least in a row.")
+
+    pairs = [(left, right) for left, right in itertools.permutations(row, 2)
+             if right != 0 and left % right == 0]
+    if not pairs:
+        raise NoDivisorsFound("No evenly dividable numbers in the line.")
+
+    return min(pairs, key=lambda pair: (pair[1], pair[0]))
+
+
+def divisors(row: t.List[int]) -> t.Tuple[int, ...]:
+    """Find an evenly divisible pair in a spreadsheet row, as
+    (dividend, divisor).
+
+    Whichever search is fastest for the row, the pair found is the one with
+    the smallest divisor, then the smallest dividend. Unlike
+    pairwise_divisors, that's not always the first pair in the row.
+
+    raises:
+      NoDivisorsFound
+      TooFewValuesInLine
+    """
+    if len(row) < 2:
+        raise TooFewValuesInLine("Must have two numbers at least in a row.")
+
+    if min(row) <= 0:
+        return smallest_pairwise_divisors(row)
+    if len(row) >= SIEVE_MIN_WIDTH and max(row) <= SIEVE_LIMIT:
+        return sieve_divisors(row)
+    return sorted_divisors(row)
+
+
+def div_row_checksum(row: t.List[int]) -> int:
+    """Calculate the second checksum of a spreadsheet row.
+
+    raises:
+      NoDivisorsFound
+      TooFewValuesInLine
+    """
+    left, right = divisors(row)
+    return left // right
+
+
+def divisor_checksum_of_rows(rows: t.Iterable[t.List[int]]) -> int:
     """2nd checksum version of a row.
 
-    Sum of evenly divisible pair in each row.
+    Sum of evenly divisible pair in each row. Rows with more than one pair
+    use the pair with the smallest divisor, then the smallest dividend.
 
     raises:
       NoDivisorsFound
       TooFewValuesInLine
     """
-    row_nums = map(divisors, rows)
-    return sum(left // right for left, right in row_nums)
+    return sum(map(div_row_checksum, rows))
 
 
 def divisor_checksum(spreadsheet: t.IO[str]) -> int:
@@ -105,8 +250,588 @@ def divisor_checksum(spreadsheet: t.IO[str]) -> int:
       NoDivisorsFound
       TooFewValuesInLine
     """
-    rows = spreadsheet_to_numbers(spreadsheet.readlines())
-    return int(divisor_checksum_of_rows(rows))
+    return int(divisor_checksum_of_rows(rows_of(spreadsheet)))
+
+
+# ==== Both at once ====
+def both_checksums_of_rows(
+        rows: t.Iterable[t.List[int]]) -> t.Tuple[int, int]:
+    """Both checksums of a spreadsheet's rows, as (diff, div), in one pass.
+
+    raises:
+      NoDivisorsFound
+      TooFewValuesInLine
+    """
+    diff_total = div_total = 0
+    for row in rows:
+        diff_total += diff_row_checksum(row)
+        div_total += div_row_checksum(row)
+    return diff_total, div_total
+
+
+def both_checksums(spreadsheet: t.IO[str]) -> t.Tuple[int, int]:
+    """Both checksums of a spreadsheet file, as (diff, div).
+
+    Reads the file once, a row at a time, so only the widest row is ever held
+    in memory.
+
+    raises:
+      NoDivisorsFound
+      TooFewValuesInLine
+      ValueError
+    """
+    return both_checksums_of_rows(rows_of(spreadsheet))
+
+
+# ==== Editable ====
+RowDivisor = t.Union[int, ValueError]
+
+
+class Spreadsheet(object):
+    """A spreadsheet which keeps both checksums up to date as rows change.
+
+    Each row's checksums are worked out when it goes in, and the totals are
+    adjusted as rows are replaced, inserted or deleted - an edit only costs
+    as much as checksumming the rows it touches.
+    """
+
+    def __init__(self, rows: t.Iterable[t.List[int]] = ()) -> None:
+        self._rows = []  # type: t.List[t.List[int]]
+        self._diffs = []  # type: t.List[int]
+        # The div checksum of each row, or why it doesn't have one.
+        self._divs = []  # type: t.List[RowDivisor]
+        self._diff_total = 0
+        self._div_total = 0
+        self._rows_without_divisors = 0
+
+        for row in rows:
+            self.append(row)
+
+    @classmethod
+    def load(cls, spreadsheet: t.Iterable[str]) -> 'Spreadsheet':
+        """Read a spreadsheet file.
+
+        raises:
+          ValueError
+        """
+        return cls(rows_of(spreadsheet))
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def __getitem__(self, index: int) -> t.List[int]:
+        return list(self._rows[index])
+
+    def __setitem__(self, index: int, row: t.List[int]) -> None:
+        self.replace(index, row)
+
+    def __delitem__(self, index: int) -> None:
+        self.delete(index)
+
+    @property
+    def diff_checksum(self) -> int:
+        """Sum of each row's maximum minus its minimum."""
+        return self._diff_total
+
+    @property
+    def div_checksum(self) -> int:
+        """Sum of each row's evenly divisible pair, divided.
+
+        raises:
+          NoDivisorsFound
+          TooFewValuesInLine
+        """
+        if self._rows_without_divisors:
+            raise next(div for div in self._divs
+                       if isinstance(div, ValueError))
+        return self._div_total
+
+    def insert(self, index: int, row: t.List[int]) -> None:
+        """Insert a row before `index`.
+
+        raises:
+          ValueError: for empty rows.
+        """
+        diff, div = self._checksum(row)
+        self._rows.insert(index, list(row))
+        self._diffs.insert(index, diff)
+        self._divs.insert(index, div)
+        self._count(diff, div, 1)
+
+    def append(self, row: t.List[int]) -> None:
+        """Add a row to the end.
+
+        raises:
+          ValueError: for empty rows.
+        """
+        self.insert(len(self._rows), row)
+
+    def replace(self, index: int, row: t.List[int]) -> None:
+        """Replace the row at `index`.
+
+        raises:
+          ValueError: for empty rows.
+        """
+        diff, div = self._checksum(row)
+        self._count(self._diffs[index], self._divs[index], -1)
+        self._rows[index] = list(row)
+        self._diffs[index] = diff
+        self._divs[index] = div
+        self._count(diff, div, 1)
+
+    def delete(self, index: int) -> None:
+        """Remove the row at `index`."""
+        self._count(self._diffs[index], self._divs[index], -1)
+        del self._rows[index]
+        del self._diffs[index]
+        del self._divs[index]
+
+    @staticmethod
+    def _checksum(row: t.List[int]) -> t.Tuple[int, RowDivisor]:
+        if not row:
+            raise ValueError("Spreadsheet rows can't be empty.")
+
+        try:
+            div = div_row_checksum(row)  # type: RowDivisor
+        except (NoDivisorsFound, TooFewValuesInLine) as err:
+            div = err
+        return diff_row_checksum(row), div
+
+    def _count(self, diff: int, div: RowDivisor, sign: int) -> None:
+        """Add a row's checksums to the totals, or take them away."""
+        self._diff_total += sign * diff
+        if isinstance(div, ValueError):
+            self._rows_without_divisors += sign
+        else:
+            self._div_total += sign * div
+
+
+# ==== In parallel ====
+# Split the file into this many ranges per worker, to even out the load.
+RANGES_PER_WORKER = 4
+
+ByteRange = t.Tuple[int, int]
+
+
+def line_aligned_ranges(path: str, parts: int) -> t.List[ByteRange]:
+    """Split a file into about `parts` byte ranges, each of whole lines."""
+    size = os.path.getsize(path)
+    boundaries = [0]
+    with open(path, 'rb') as spreadsheet:
+        for part in range(1, parts):
+            # Move on to the start of the line after the split point.
+            spreadsheet.seek(max(size * part // parts - 1, boundaries[-1]))
+            spreadsheet.readline()
+            if spreadsheet.tell() < size:
+                boundaries.append(spreadsheet.tell())
+    boundaries.append(size)
+
+    return [(start, stop) for start, stop in zip(boundaries, boundaries[1:])
+            if start < stop]
+
+
+def _range_lines(mapped: mmap.mmap,
+                 byte_range: ByteRange) -> t.Iterator[str]:
+    """The lines in a byte range of a mapped file."""
+    start, stop = byte_range
+    mapped.seek(start)
+    while mapped.tell() < stop:
+        yield mapped.readline().decode('ascii')
+
+
+def checksum_range(path: str, byte_range: ByteRange) -> t.Tuple[int, int]:
+    """Both checksums of the rows in a byte range of a spreadsheet file.
+
+    Maps the file itself, so a worker process only gets sent the range.
+
+    raises:
+      NoDivisorsFound
+      TooFewValuesInLine
+      ValueError
+    """
+    with open(path, 'rb') as spreadsheet, \
+            mmap.mmap(spreadsheet.fileno(), 0,
+                      access=mmap.ACCESS_READ) as mapped:
+        return both_checksums_of_rows(
+            rows_of(_range_lines(mapped, byte_range)))
+
+
+def parallel_checksums(path: str,
+                       workers: t.Optional[int] = None) -> t.Tuple[int, int]:
+    """Both checksums of a spreadsheet file, as (diff, div), split over
+    processes.
+
+    raises:
+      NoDivisorsFound
+      TooFewValuesInLine
+      ValueError
+    """
+    workers = workers or os.cpu_count() or 1
+    ranges = line_aligned_ranges(path, workers * RANGES_PER_WORKER)
+
+    diff_total = div_total = 0
+    with concurrent.futures.ProcessPoolExecutor(workers) as pool:
+        for diff_sum, div_sum in pool.map(checksum_range,
+                                          itertools.repeat(path), ranges):
+            diff_total += diff_sum
+            div_total += div_sum
+    return diff_total, div_total
+
+
+# ==== As arrays ====
+# Most (row, dividend, divisor) triples to test in one go, for div on arrays.
+DIV_PAIRS_PER_BLOCK = 1 << 22
+
+ArrayReducer = t.Callable[[np.ndarray], np.ndarray]
+RowReducer = t.Callable[[t.List[int]], int]
+
+
+class IrregularSpreadsheet(ValueError):
+    """This spreadsheet can't be checksummed as an array."""
+    pass
+
+
+def rows_to_array(rows: t.List[t.List[int]]) -> np.ndarray:
+    """Rows of numbers to a 2-D array of integers.
+
+    Ragged rows are padded out to the widest row, and the padding masked -
+    giving a masked array.
+
+    raises:
+      IrregularSpreadsheet: for empty rows or numbers too large for int64.
+    """
+    widths = np.array(list(map(len, rows)), dtype=np.int64)
+    if not len(widths) or not widths.min():
+        raise IrregularSpreadsheet("Can't make an array with empty rows.")
+
+    try:
+        if widths.min() == widths.max():
+            return np.array(rows, dtype=np.int64)
+
+        padded = np.zeros((len(rows), widths.max()), dtype=np.int64)
+        for index, row in enumerate(rows):
+            padded[index, :len(row)] = row
+    except OverflowError:
+        raise IrregularSpreadsheet("Numbers too large for an array.")
+
+    padding = np.arange(widths.max()) >= widths[:, np.newaxis]
+    return np.ma.MaskedArray(padded, mask=padding)
+
+
+def load_array(lines: t.Iterable[str]) -> np.ndarray:
+    """Text of spreadsheet to a 2-D array of integers.
+
+    raises:
+      IrregularSpreadsheet
+      ValueError
+    """
+    return rows_to_array(spreadsheet_to_numbers(lines))
+
+
+def diff_array_rows(array: np.ndarray) -> np.ndarray:
+    """First checksum of every row of an array."""
+    return array.max(axis=1) - array.min(axis=1)
+
+
+def div_array_rows(array: np.ndarray) -> np.ndarray:
+    """Second checksum of every row of an array.
+
+    Tests every pair in a block of rows at once, and like divisors() picks
+    the pair with the smallest divisor, then the smallest dividend.
+
+    raises:
+      IrregularSpreadsheet: for rows too wide to pair up, or with numbers
+        which aren't positive.
+      NoDivisorsFound
+      TooFewValuesInLine
+    """
+    values = np.ma.getdata(array)
+    present = ~np.ma.getmaskarray(array)
+    height, width = values.shape
+    if width * width > DIV_PAIRS_PER_BLOCK:
+        raise IrregularSpreadsheet("Rows too wide to pair up as an array.")
+    if (present.sum(axis=1) < 2).any():
+        raise TooFewValuesInLine("Must have two numbers at least in a row.")
+    if (values[present] <= 0).any():
+        raise IrregularSpreadsheet("Can only pair up positive numbers.")
+
+    # Padding is never paired up, stand in something harmless to divide by.
+    values = np.where(present, values, 1)
+    largest = np.iinfo(np.int64).max
+    other_column = ~np.eye(width, dtype=bool)
+    block_height = max(1, DIV_PAIRS_PER_BLOCK // (width * width))
+    quotients = np.empty(height, dtype=np.int64)
+    for start in range(0, height, block_height):
+        block = values[start:start + block_height]
+        in_row = present[start:start + block_height]
+        dividends = block[:, :, np.newaxis]
+        divisors = block[:, np.newaxis, :]
+
+        even = ((dividends % divisors == 0) & other_column &
+                in_row[:, :, np.newaxis] & in_row[:, np.newaxis, :])
+        if not even.any(axis=(1, 2)).all():
+            raise NoDivisorsFound("No evenly dividable numbers in the line.")
+
+        divisor = np.where(even, divisors, largest).min(axis=(1, 2))
+        smallest = even & (divisors == divisor[:, np.newaxis, np.newaxis])
+        dividend = np.where(smallest, dividends, largest).min(axis=(1, 2))
+        quotients[start:start + block_height] = dividend // divisor
+
+    return quotients
+
+
+# Checksum policies, on a whole array at a time, and on one row at a time.
+ARRAY_REDUCERS = {
+    'diff': diff_array_rows,
+    'div': div_array_rows,
+}  # type: t.Dict[str, ArrayReducer]
+ROW_REDUCERS = {
+    'diff': diff_row_checksum,
+    'div': div_row_checksum,
+}  # type: t.Dict[str, RowReducer]
+
+
+def array_checksum(spreadsheet: t.Iterable[str], policy: str) -> int:
+    """Checksum a spreadsheet as an array, with the `policy` reducers.
+
+    Spreadsheets which don't fit an array, or the policy's array reducer,
+    fall back to checksumming one row at a time.
+
+    raises:
+      NoDivisorsFound
+      TooFewValuesInLine
+      ValueError
+    """
+    rows = spreadsheet_to_numbers(spreadsheet)
+    try:
+        return int(ARRAY_REDUCERS[policy](rows_to_array(rows)).sum())
+    except IrregularSpreadsheet:
+        return sum(map(ROW_REDUCERS[policy], rows))
+
+
+# ==== Cached ====
+# Parsed sheets are cached in a sidecar file next to them, with this suffix.
+SIDECAR_SUFFIX = '.sheetcache'
+# Sidecars being written have this suffix, so pruning leaves them alone.
+PARTIAL_SUFFIX = SIDECAR_SUFFIX + '.tmp'
+# Most bytes of sidecars to keep in one directory.
+CACHE_LIMIT = 1 << 30
+
+# Magic, size and mtime (ns) of the sheet, SHA-256 of the sheet, rows, values.
+# The values follow the header, then the offset of each row in the values.
+_SIDECAR_HEADER = struct.Struct('<8sQq32sQQ')
+_SIDECAR_MAGIC = b'SHEETC01'
+_SIDECAR_INT = np.dtype('<i8')
+
+
+class CachedSheet(object):
+    """A parsed spreadsheet, memory mapped from its sidecar file."""
+
+    def __init__(self, offsets: np.ndarray, values: np.ndarray) -> None:
+        self.offsets = offsets
+        self.values = values
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def rows(self) -> t.Iterator[t.List[int]]:
+        """Each row of numbers, in order."""
+        bounds = self.offsets.tolist()
+        for start, stop in zip(bounds, bounds[1:]):
+            yield self.values[start:stop].tolist()
+
+    def array(self) -> np.ndarray:
+        """The rows as a 2-D array, without copying them.
+
+        raises:
+          IrregularSpreadsheet: if the rows aren't all the same width.
+        """
+        widths = np.diff(self.offsets)
+        if not len(widths) or widths.min() != widths.max():
+            raise IrregularSpreadsheet("Only rectangular sheets are arrays.")
+        return self.values.reshape(len(widths), int(widths[0]))
+
+
+def sidecar_path(path: str) -> str:
+    """Where the parsed cache of a sheet goes."""
+    return path + SIDECAR_SUFFIX
+
+
+def _content_hash(path: str) -> bytes:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as spreadsheet:
+        for chunk in iter(lambda: spreadsheet.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.digest()
+
+
+def write_sidecar(path: str) -> str:
+    """Parse a sheet, a row at a time, into its sidecar file.
+
+    raises:
+      IrregularSpreadsheet: for empty rows or numbers too large for int64.
+      ValueError
+    """
+    sheet_stat = os.stat(path)
+    content_hash = _content_hash(path)
+    offsets = array.array('q', [0])
+
+    directory = os.path.dirname(os.path.abspath(path))
+    with open(path) as spreadsheet, tempfile.NamedTemporaryFile(
+            dir=directory, suffix=PARTIAL_SUFFIX, delete=False) as packed:
+        try:
+            packed.write(bytes(_SIDECAR_HEADER.size))
+            for row in rows_of(spreadsheet):
+                if not row:
+                    raise IrregularSpreadsheet("Can't cache empty rows.")
+                try:
+                    packed.write(np.array(row, dtype=_SIDECAR_INT).tobytes())
+                except OverflowError:
+                    raise IrregularSpreadsheet("Numbers too large to cache.")
+                offsets.append(offsets[-1] + len(row))
+
+            packed.write(np.array(offsets, dtype=_SIDECAR_INT).tobytes())
+            packed.seek(0)
+            packed.write(_SIDECAR_HEADER.pack(
+                _SIDECAR_MAGIC, sheet_stat.st_size, sheet_stat.st_mtime_ns,
+                content_hash, len(offsets) - 1, offsets[-1]))
+        except BaseException:
+            packed.close()
+            os.unlink(packed.name)
+            raise
+
+    os.replace(packed.name, sidecar_path(path))
+    return sidecar_path(path)
+
+
+def read_sidecar(path: str,
+                 verify_hash: bool = True) -> t.Optional[CachedSheet]:
+    """Map the cached rows of a sheet, if they're up to date.
+
+    Missing, broken or stale sidecars give None. A sidecar is stale if the
+    sheet's size or mtime changed, or, with `verify_hash`, its contents.
+    """
+    sidecar = sidecar_path(path)
+    try:
+        with open(sidecar, 'rb') as packed:
+            header = packed.read(_SIDECAR_HEADER.size)
+        magic, size, mtime_ns, content_hash, rows, values = \
+            _SIDECAR_HEADER.unpack(header)
+        sheet_stat = os.stat(path)
+    except (OSError, struct.error):
+        return None
+
+    if magic != _SIDECAR_MAGIC or \
+            (size, mtime_ns) != (sheet_stat.st_size, sheet_stat.st_mtime_ns):
+        return None
+    try:
+        if verify_hash and content_hash != _content_hash(path):
+            return None
+    except OSError:
+        return None
+
+    def mapped(offset: int, count: int) -> np.ndarray:
+        if not count:
+            return np.zeros(0, dtype=_SIDECAR_INT)
+        return np.memmap(sidecar, dtype=_SIDECAR_INT, mode='r',
+                         offset=offset, shape=(count,))
+
+    values_at = _SIDECAR_HEADER.size
+    offsets_at = values_at + values * _SIDECAR_INT.itemsize
+    try:
+        sheet = CachedSheet(offsets=mapped(offsets_at, rows + 1),
+                            values=mapped(values_at, values))
+    except (ValueError, OSError):
+        # Truncated, or gone.
+        return None
+
+    # Recently used sidecars are the last to be pruned.
+    try:
+        os.utime(sidecar)
+    except OSError:
+        return None
+    return sheet
+
+
+def prune_sidecars(directory: str, max_bytes: int = CACHE_LIMIT,
+                   keep: t.Optional[str] = None) -> t.List[str]:
+    """Remove the least recently used sidecars in a directory, until they
+    take up no more than `max_bytes`. Returns the ones removed."""
+    sidecars = []
+    for name in os.listdir(directory):
+        if name.endswith(SIDECAR_SUFFIX):
+            sidecar = os.path.join(directory, name)
+            try:
+                sidecar_stat = os.stat(sidecar)
+            except FileNotFoundError:
+                # Pruned by another run.
+                continue
+            sidecars.append((sidecar_stat.st_mtime_ns, sidecar_stat.st_size,
+                             sidecar))
+
+    total = sum(size for _, size, _ in sidecars)
+    removed = []
+    for _, size, sidecar in sorted(sidecars):
+        if total <= max_bytes:
+            break
+        try:
+            if keep is not None and os.path.samefile(sidecar, keep):
+                continue
+            os.unlink(sidecar)
+        except FileNotFoundError:
+            # Pruned by another run.
+            pass
+        else:
+            removed.append(sidecar)
+        total -= size
+    return removed
+
+
+def load_cached(path: str,
+                verify_hash: bool = True) -> t.Optional[CachedSheet]:
+    """The cached rows of a sheet, parsing and caching it first if need be.
+
+    Sheets which can't be cached, or whose sidecars can't be written (or
+    read back), give None - the cache is only ever a shortcut.
+
+    raises:
+      ValueError
+    """
+    sheet = read_sidecar(path, verify_hash)
+    if sheet is not None:
+        return sheet
+
+    try:
+        sidecar = write_sidecar(path)
+        prune_sidecars(os.path.dirname(sidecar) or '.', keep=sidecar)
+    except (IrregularSpreadsheet, OSError):
+        return None
+    return read_sidecar(path, verify_hash=False)
+
+
+def cached_checksum(path: str, policy: str, verify_hash: bool = True) -> int:
+    """Checksum a sheet from its sidecar cache, with the `policy` reducers.
+
+    raises:
+      NoDivisorsFound
+      TooFewValuesInLine
+      ValueError
+    """
+    sheet = load_cached(path, verify_hash)
+    if sheet is None:
+        with open(path) as spreadsheet:
+            return sum(map(ROW_REDUCERS[policy], rows_of(spreadsheet)))
+
+    try:
+        return int(ARRAY_REDUCERS[policy](sheet.array()).sum())
+    except IrregularSpreadsheet:
+        return sum(map(ROW_REDUCERS[policy], sheet.rows()))
+
+
+def _echo_both(checksums: t.Tuple[int, int]) -> None:
+    """Print both checksums, one per line."""
+    for policy, value in zip(('diff', 'div'), checksums):
+        click.echo("{}\t{}".format(policy, value))
 
 
 @click.group()
@@ -115,18 +840,82 @@ def checksum() -> None:
     pass
 
 
+array_option = click.option(
+    '--array', is_flag=True,
+    help="Load the sheet into a NumPy array and reduce all rows at once.")
+cache_option = click.option(
+    '--cache', is_flag=True,
+    help="Reuse the parsed sheet from a sidecar file, creating it if need be.")
+
+
+def _cached_path(spreadsheet: t.IO[str]) -> str:
+    """Only files on disk can have a sidecar cache."""
+    if not os.path.isfile(spreadsheet.name):
+        raise click.BadParameter("Can only cache files on disk.")
+    return spreadsheet.name
+
+
 @checksum.command()
 @click.argument('spreadsheet', type=click.File())
-def diff(spreadsheet: t.IO[str]) -> None:
+@array_option
+@cache_option
+def diff(spreadsheet: t.IO[str], array: bool, cache: bool) -> None:
     """Each row's minimum value is subtracted from its maximum."""
-    click.echo(str(difference_checksum(spreadsheet)))
+    if cache:
+        click.echo(str(cached_checksum(_cached_path(spreadsheet), 'diff')))
+    elif array:
+        click.echo(str(array_checksum(spreadsheet, 'diff')))
+    else:
+        click.echo(str(difference_checksum(spreadsheet)))
+
+
+@checksum.command()
+@click.argument('spreadsheet', type=click.File())
+@array_option
+@cache_option
+def div(spreadsheet: t.IO[str], array: bool, cache: bool) -> None:
+    """Each row has one evenly divisible pair - each divided pair is summed.
+
+    Rows with more than one use the pair with the smallest divisor.
+    """
+    if cache:
+        click.echo(str(cached_checksum(_cached_path(spreadsheet), 'div')))
+    elif array:
+        click.echo(str(array_checksum(spreadsheet, 'div')))
+    else:
+        click.echo(str(divisor_checksum(spreadsheet)))
 
 
 @checksum.command()
 @click.argument('spreadsheet', type=click.File())
-def div(spreadsheet: t.IO[str]) -> None:
-    """Each row has one evenly divisible pair - each divided pair is summed."""
-    click.echo(str(divisor_checksum(spreadsheet)))
+@cache_option
+def both(spreadsheet: t.IO[str], cache: bool) -> None:
+    """Both checksums, diff and div, in a single pass over the file."""
+    if cache:
+        path = _cached_path(spreadsheet)
+        _echo_both((cached_checksum(path, 'diff'),
+                    cached_checksum(path, 'div', verify_hash=False)))
+    else:
+        _echo_both(both_checksums(spreadsheet))
+
+
+@checksum.command('prune-cache')
+@click.argument('directory', type=click.Path(exists=True, file_okay=False))
+@click.option('--max-bytes', type=int, default=CACHE_LIMIT, show_default=True,
+              help="Most bytes of sidecar caches to keep.")
+def prune_cache(directory: str, max_bytes: int) -> None:
+    """Remove the least recently used sidecar caches in a directory."""
+    for sidecar in prune_sidecars(directory, max_bytes):
+        click.echo("Removed {}".format(sidecar))
+
+
+@checksum.command()
+@click.argument('spreadsheet', type=click.Path(exists=True, dir_okay=False))
+@click.option('-w', '--workers', type=int,
+              help="Processes to use. Default: one per CPU.")
+def parallel(spreadsheet: str, workers: t.Optional[int]) -> None:
+    """Both checksums, with the file split between several processes."""
+    _echo_both(parallel_checksums(spreadsheet, workers))
 
 
 def main() -> None:
@@ -1,5 +1,11 @@
 """Tests for day 2 of the Advent of Code, 2017."""
 import io
+import os
+import random
+import typing as t
+
+import numpy as np
+import pytest
 
 import spreadsheet_checksum as sc
 
@@ -70,3 +76,185 @@ def test_divisor_checksum() -> None:
 def test_file_divisor_checksum() -> None:
     """Second checksum type, with file reading."""
     assert sc.divisor_checksum(io.StringIO(test_divisor_data)) == 9
+
+
+def test_divisor_searches_agree() -> None:
+    """The sorted and sieve searches find the same pair, and one which the
+    pairwise reference agrees divides evenly."""
+    rng = random.Random(2017)
+    for _ in range(200):
+        row = [rng.randrange(1, 500) for _ in range(rng.randrange(2, 40))]
+        try:
+            left, right = sc.pairwise_divisors(row)
+        except sc.NoDivisorsFound:
+            with pytest.raises(sc.NoDivisorsFound):
+                sc.sorted_divisors(row)
+            with pytest.raises(sc.NoDivisorsFound):
+                sc.sieve_divisors(row)
+            continue
+
+        found = sc.sorted_divisors(row)
+        assert sc.sieve_divisors(row) == found
+        assert sc.smallest_pairwise_divisors(row) == found
+        assert found[0] % found[1] == 0
+        assert min(row) <= found[1] <= right
+
+
+def test_divisors_repeated_value() -> None:
+    """A value which appears twice divides itself."""
+    assert sc.sorted_divisors([7, 5, 7]) == (7, 7)
+    assert sc.sieve_divisors([7, 5, 7]) == (7, 7)
+
+
+def test_divisors_sign_independent() -> None:
+    """Rows with several pairs, negative or not, use the smallest divisor."""
+    assert sc.divisors([12, 6, 2]) == (6, 2)
+    assert sc.divisors([12, 6, 2, 0]) == (0, 2)
+    assert sc.divisors([12, 6, -4]) == (12, -4)
+    assert sc.divisor_checksum_of_rows([[12, 6, 2], [-12, 6, 4]]) == 3 - 3
+
+
+def test_divisors_too_few_values() -> None:
+    """A single value has nothing to pair up with."""
+    for search in (sc.divisors, sc.sorted_divisors, sc.sieve_divisors,
+                   sc.smallest_pairwise_divisors):
+        with pytest.raises(sc.TooFewValuesInLine):
+            search([4])
+
+
+def test_both_checksums() -> None:
+    """Both checksums in one pass match each one on their own."""
+    spreadsheet = io.StringIO(test_divisor_data)
+    assert sc.both_checksums(spreadsheet) == (
+        sc.difference_checksum(io.StringIO(test_divisor_data)),
+        sc.divisor_checksum(io.StringIO(test_divisor_data)))
+
+
+def test_load_array_ragged() -> None:
+    """Ragged rows are padded out, with the padding masked."""
+    array = sc.load_array(test_diff_data.splitlines())
+    assert isinstance(array, np.ma.MaskedArray)
+    assert array.shape == (3, 4)
+    assert list(np.ma.getmaskarray(array)[1]) == [False, False, False, True]
+    assert list(sc.diff_array_rows(array)) == [8, 4, 6]
+
+
+def test_array_checksums() -> None:
+    """Array reducers agree with the row by row checksums."""
+    assert sc.array_checksum(test_diff_data.splitlines(), 'diff') == 18
+    assert sc.array_checksum(test_divisor_data.splitlines(), 'div') == 9
+    ragged = ["5 9 2 8 7", "9 4 7 3", "3 8 6 5 6"]
+    assert sc.array_checksum(ragged, 'div') == \
+        sc.divisor_checksum_of_rows(sc.spreadsheet_to_numbers(ragged))
+
+
+def test_array_checksum_falls_back() -> None:
+    """Sheets that don't fit an array are checksummed row by row."""
+    huge = ["1 {}".format(2 ** 70), "2 4"]
+    with pytest.raises(sc.IrregularSpreadsheet):
+        sc.load_array(huge)
+    assert sc.array_checksum(huge, 'diff') == 2 ** 70 - 1 + 2
+    assert sc.array_checksum(huge, 'div') == 2 ** 70 + 2
+
+
+def test_line_aligned_ranges(tmp_path) -> None:
+    """Ranges cover the whole file, and each starts on a new line."""
+    path = tmp_path / 'sheet'
+    path.write_text(test_divisor_data + "\n" + test_divisor_data)
+    content = path.read_bytes()
+    ranges = sc.line_aligned_ranges(str(path), 4)
+    assert ranges[0][0] == 0 and ranges[-1][1] == len(content)
+    for (_, stop), (start, _) in zip(ranges, ranges[1:]):
+        assert stop == start and content[start - 1:start] == b'\n'
+
+
+def test_parallel_checksums(tmp_path) -> None:
+    """Splitting the file up gives the same checksums."""
+    path = tmp_path / 'sheet'
+    path.write_text((test_divisor_data + "\n") * 10)
+    expected = sc.both_checksums(io.StringIO((test_divisor_data + "\n") * 10))
+    assert sc.parallel_checksums(str(path), workers=2) == expected
+
+
+def test_sidecar_cache(tmp_path) -> None:
+    """The second run reads the sidecar, and edits invalidate it."""
+    path = tmp_path / 'sheet'
+    path.write_text(test_divisor_data + "\n")
+    assert sc.read_sidecar(str(path)) is None
+
+    assert sc.cached_checksum(str(path), 'div') == 9
+    sheet = sc.read_sidecar(str(path))
+    assert sheet is not None
+    assert list(sheet.rows()) == sc.spreadsheet_to_numbers(
+        test_divisor_data.splitlines())
+    assert sc.cached_checksum(str(path), 'diff') == 18
+
+    path.write_text("1 5\n")
+    assert sc.read_sidecar(str(path)) is None
+    assert sc.cached_checksum(str(path), 'diff') == 4
+
+
+def test_sidecar_cache_is_optional(tmp_path, monkeypatch) -> None:
+    """Sidecars that can't be written, or touched, fall back to parsing."""
+    path = tmp_path / 'sheet'
+    path.write_text(test_divisor_data + "\n")
+
+    def fail(*args: t.Any, **kwargs: t.Any) -> None:
+        raise PermissionError("Read-only")
+
+    with monkeypatch.context() as patched:
+        patched.setattr(sc.tempfile, 'NamedTemporaryFile', fail)
+        assert sc.load_cached(str(path)) is None
+        assert sc.cached_checksum(str(path), 'div') == 9
+
+    sc.write_sidecar(str(path))
+    monkeypatch.setattr(sc.os, 'utime', fail)
+    assert sc.read_sidecar(str(path)) is None
+    assert sc.cached_checksum(str(path), 'diff') == 18
+
+
+def test_prune_sidecars(tmp_path) -> None:
+    """The least recently used sidecars go first."""
+    for name in ('old', 'new'):
+        path = tmp_path / name
+        path.write_text(test_divisor_data)
+        sc.write_sidecar(str(path))
+    old = sc.sidecar_path(str(tmp_path / 'old'))
+    os.utime(old, ns=(0, 0))
+
+    size = os.path.getsize(old)
+    assert sc.prune_sidecars(str(tmp_path), max_bytes=size) == [old]
+    assert sc.prune_sidecars(str(tmp_path), max_bytes=size) == []
+
+    # Sidecars still being written are left alone.
+    partial = str(tmp_path / ('new' + sc.PARTIAL_SUFFIX))
+    with open(partial, 'wb') as packed:
+        packed.write(bytes(size))
+    os.utime(partial, ns=(0, 0))
+    assert sc.prune_sidecars(str(tmp_path), max_bytes=0) == [
+        sc.sidecar_path(str(tmp_path / 'new'))]
+    assert os.path.exists(partial)
+
+
+def test_spreadsheet_edits() -> None:
+    """Totals follow replaced, inserted and deleted rows."""
+    sheet = sc.Spreadsheet.load(io.StringIO(test_divisor_data))
+    assert (sheet.diff_checksum, sheet.div_checksum) == (18, 9)
+
+    sheet[0] = [10, 5, 3]
+    sheet.insert(1, [7, 21])
+    del sheet[2]
+    rows = [[10, 5, 3], [7, 21], [3, 8, 6, 5]]
+    assert [sheet[index] for index in range(len(sheet))] == rows
+    assert (sheet.diff_checksum, sheet.div_checksum) == \
+        sc.both_checksums_of_rows(rows)
+
+
+def test_spreadsheet_without_divisors() -> None:
+    """The div checksum is unavailable while any row lacks a pair."""
+    sheet = sc.Spreadsheet([[5, 9, 2, 8], [7, 5, 3]])
+    assert sheet.diff_checksum == 11
+    with pytest.raises(sc.NoDivisorsFound):
+        sheet.div_checksum
+    sheet.replace(1, [7, 14])
+    assert sheet.div_checksum == 6
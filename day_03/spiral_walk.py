@@ -7,28 +7,36 @@ Puzzles involving memory stored on an infinite two-dimensional grid.
 Each square on the grid is allocated in a spiral pattern starting at a location
 marked 1 and then counting up while spiraling outward.
 """
+import array
+import bisect
+import itertools
+import math
+import os
+import tempfile
 import typing as t
 
 import attr
 import click
+import numpy as np
 
 
 @attr.s(frozen=True)
 class Step(object):
     """A move, Right, Up, Left, Down."""
-    x = attr.ib(attr.validators.instance_of(int))  # type: int
-    y = attr.ib(attr.validators.instance_of(int))  # type: int
+    x = attr.ib(validator=attr.validators.instance_of(int))  # type: int
+    y = attr.ib(validator=attr.validators.instance_of(int))  # type: int
 
 
 @attr.s(frozen=True)
 class Coordinate(object):
     """Cartesian coordinate - (x, y)."""
-    x = attr.ib(attr.validators.instance_of(int))
-    y = attr.ib(attr.validators.instance_of(int))
+    x = attr.ib(validator=attr.validators.instance_of(int))
+    y = attr.ib(validator=attr.validators.instance_of(int))
 
-    def move(self, step: Step):
-        """Take a step, land on a new Coordinate."""
-        return attr.evolve(self, x=self.x + step.x, y=self.y + step.y)
+    def move(self, step: Step, times: int = 1):
+        """Take a step (`times` times over), land on a new Coordinate."""
+        return attr.evolve(self, x=self.x + step.x * times,
+                           y=self.y + step.y * times)
 
     @property
     def distance(self):
@@ -42,9 +50,18 @@ Down = Step(x=0, y=-1)
 
 Memory = t.Dict[Coordinate, int]
 
+# Batch results are written out this many lines at a time.
+OUTPUT_BLOCK = 65536
+# Largest position worked out with numpy; walk_to handles larger ones.
+INT64_MAX = np.iinfo(np.int64).max
 
-def path() -> t.Iterable[Step]:
-    """Generate the movements of the memory spiral.
+# (dx, dy) of the eight neighbours around a memory location.
+NEIGHBOR_OFFSETS = ((1, 0), (1, 1), (0, 1), (-1, 1),
+                    (-1, 0), (-1, -1), (0, -1), (1, -1))
+
+
+def path_segments() -> t.Iterable[t.Tuple[Step, int]]:
+    """Generate the movements of the memory spiral, as (step, count) runs.
 
     Each spiral is two movements - for example, if we start at position 1:
     1
@@ -56,23 +73,23 @@ def path() -> t.Iterable[Step]:
     6 1 2
     7
     To create the next Spiral We add two of each type of step to each corner.
-    The first spiral is thus RU+LLDD
-    The second spiral is then: RRRUUU+LLLLDDDD
+    The first spiral is thus R1 U1 + L2 D2
+    The second spiral is then: R3 U3 + L4 D4
     """
-    # Starting position
-    first_corner = [Right, Up]
-    second_corner = [Left, Left, Down, Down]
-
-    # Yield spiral movement
+    side = 1
     while True:
-        for movement in first_corner:
-            yield movement
-        for movement in second_corner:
-            yield movement
+        yield Right, side
+        yield Up, side
+        yield Left, side + 1
+        yield Down, side + 1
+        side += 2
 
-        # Generate next set of movements.
-        first_corner = [Right, Right] + first_corner + [Up, Up]
-        second_corner = [Left, Left] + second_corner + [Down, Down]
+
+def path() -> t.Iterable[Step]:
+    """Generate the movements of the memory spiral, one step at a time."""
+    for step, count in path_segments():
+        for _ in range(count):
+            yield step
 
 
 def neighbor_path() -> t.Iterable[Step]:
@@ -100,20 +117,251 @@ def sum_neighborhood(memory: Memory, location: Coordinate) -> int:
 def walk(steps: int) -> Coordinate:
     """Start at Coordinate(x=0, y=0), then take `steps` spiral movements."""
     location = Coordinate(x=0, y=0)
-    if steps == 0:
-        return location
 
-    for step_count, step in enumerate(path(), start=1):
+    for step, count in path_segments():
+        if count >= steps:
+            return location.move(step, steps)
+
+        location = location.move(step, count)
+        steps -= count
+
+
+def walk_to_iteratively(position: int) -> Coordinate:
+    """Walk the spiral until `position`, one step at a time.
+
+    The reference for walk_to, and walk.
+    """
+    location = Coordinate(x=0, y=0)
+    for step in itertools.islice(path(), position - 1):
         location = location.move(step)
+    return location
+
+
+def spiral_ring(position: int) -> int:
+    """Which ring of the spiral a position is on, 0 being the origin.
+
+    Ring k ends with the odd square (2k + 1)^2, in the bottom right corner.
+    """
+    return (math.isqrt(position - 1) + 1) // 2
+
 
-        if step_count >= steps:
-            return location
+def spiral_xy(position: int) -> t.Tuple[int, int]:
+    """The (x, y) of memory location `position`, worked out directly."""
+    ring = spiral_ring(position)
+    if ring == 0:
+        return 0, 0
+
+    # Each ring starts just above its bottom right corner and goes round
+    # anticlockwise: up the right side, left along the top, down the left
+    # side and right along the bottom - 2 * ring steps per side.
+    side, along = divmod(position - (2 * ring - 1) ** 2 - 1, 2 * ring)
+    if side == 0:
+        return ring, along - ring + 1
+    if side == 1:
+        return ring - 1 - along, ring
+    if side == 2:
+        return -ring, ring - 1 - along
+    return along - ring + 1, -ring
 
 
 def walk_to(position: int) -> Coordinate:
-    """Walk the spiral until `position`"""
-    steps_to_walk = position - 1
-    return walk(steps_to_walk)
+    """Find where memory location `position` is, in O(1).
+
+    raises:
+      ValueError: for positions below 1.
+    """
+    if position < 1:
+        raise ValueError("{} is not a position in memory!".format(position))
+
+    x, y = spiral_xy(position)
+    return Coordinate(x=x, y=y)
+
+
+def xy_position(x: int, y: int) -> int:
+    """The memory location at (x, y), worked out directly."""
+    ring = max(abs(x), abs(y))
+    if ring == 0:
+        return 1
+
+    # The sides as in spiral_xy, each corner belonging to the side ending
+    # there.
+    if x == ring and y > -ring:
+        along = y + ring - 1
+    elif y == ring:
+        along = 2 * ring + ring - 1 - x
+    elif x == -ring:
+        along = 4 * ring + ring - 1 - y
+    else:
+        along = 6 * ring + x + ring - 1
+    return (2 * ring - 1) ** 2 + 1 + along
+
+
+def position_of(coordinate: Coordinate) -> int:
+    """Which memory location is at `coordinate` - the inverse of walk_to."""
+    return xy_position(coordinate.x, coordinate.y)
+
+
+# ==== Many at once
+def _isqrt_many(values: np.ndarray) -> np.ndarray:
+    """Integer square roots, corrected for floating point rounding."""
+    roots = np.floor(np.sqrt(values.astype(np.float64))).astype(np.int64)
+    roots -= roots * roots > values
+    roots += (roots + 1) * (roots + 1) <= values
+    return roots
+
+
+def walk_to_many(
+        positions: np.ndarray) -> t.Tuple[np.ndarray, np.ndarray]:
+    """The x and y coordinates of many memory locations, as arrays.
+
+    raises:
+      ValueError: for positions below 1.
+    """
+    positions = np.asarray(positions, dtype=np.int64)
+    if (positions < 1).any():
+        raise ValueError("Positions in memory start at 1.")
+
+    ring = (_isqrt_many(positions - 1) + 1) // 2
+    side, along = np.divmod(positions - (2 * ring - 1) ** 2 - 1,
+                            np.maximum(2 * ring, 1))
+
+    origin = ring == 0
+    sides = [origin, side == 0, side == 1, side == 2]
+    xs = np.select(sides, [0, ring, ring - 1 - along, -ring],
+                   along - ring + 1)
+    ys = np.select(sides, [0, along - ring + 1, ring, ring - 1 - along],
+                   -ring)
+    return xs, ys
+
+
+def walk_to_any(positions: t.Sequence[str]) -> t.Tuple[np.ndarray, np.ndarray]:
+    """Like walk_to_many, for positions written out as text.
+
+    Positions too large for int64 are found one at a time with walk_to,
+    giving arrays of Python ints (dtype object) instead.
+
+    raises:
+      ValueError: for positions below 1, or text that isn't a number.
+    """
+    try:
+        return walk_to_many(np.array(positions, dtype=np.int64))
+    except OverflowError:
+        pass
+
+    values = [int(position) for position in positions]
+    fits = np.array([abs(value) <= INT64_MAX for value in values],
+                    dtype=bool)
+    xs = np.empty(len(values), dtype=object)
+    ys = np.empty(len(values), dtype=object)
+    xs[fits], ys[fits] = walk_to_many(np.array(
+        [value for value in values if abs(value) <= INT64_MAX],
+        dtype=np.int64))
+    for index in np.flatnonzero(~fits):
+        location = walk_to(values[index])
+        xs[index], ys[index] = location.x, location.y
+    return xs, ys
+
+
+def position_of_many(xs: np.ndarray, ys: np.ndarray) -> np.ndarray:
+    """The memory locations at many (x, y) coordinates, as an array."""
+    xs = np.asarray(xs, dtype=np.int64)
+    ys = np.asarray(ys, dtype=np.int64)
+    ring = np.maximum(np.abs(xs), np.abs(ys))
+
+    right = (xs == ring) & (ys > -ring)
+    top = ~right & (ys == ring)
+    left = ~right & ~top & (xs == -ring)
+    along = np.select(
+        [right, top, left],
+        [ys + ring - 1, 3 * ring - 1 - xs, 5 * ring - 1 - ys],
+        7 * ring - 1 + xs)
+    return np.where(ring == 0, 1, (2 * ring - 1) ** 2 + 1 + along)
+
+
+class SpiralMemory(object):
+    """Neighbor-sum memory, stored flat in spiral order.
+
+    Location `position` is stored at index `position - 1`, and its neighbors
+    are found as positions with xy_position - so filling memory creates no
+    Coordinates, or dicts keyed by them. Values are kept in an array('q'),
+    8 bytes each, until they outgrow 64 bits (from position 464 on), then in
+    a list.
+    """
+
+    def __init__(self, values: t.Iterable[int] = (1,)) -> None:
+        self.values = array.array('q')  # type: t.MutableSequence[int]
+        for value in values:
+            self._store(value)
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def __getitem__(self, position: int) -> int:
+        """The value at memory location `position`, filled in or not."""
+        if position < 1:
+            raise IndexError("Positions in memory start at 1.")
+        self.fill(position)
+        return self.values[position - 1]
+
+    def fill(self, until: int) -> None:
+        """Fill in memory up to location `until`."""
+        values = self.values
+        for position in range(len(values) + 1, until + 1):
+            x, y = spiral_xy(position)
+            neighborhood_value = 0
+            for dx, dy in NEIGHBOR_OFFSETS:
+                neighbor = xy_position(x + dx, y + dy)
+                if neighbor < position:
+                    neighborhood_value += values[neighbor - 1]
+            values = self._store(neighborhood_value)
+
+    def _store(self, value: int) -> t.MutableSequence[int]:
+        """Store the next value, moving to a list if it won't fit 64 bits."""
+        try:
+            self.values.append(value)
+        except OverflowError:
+            self.values = list(self.values)
+            self.values.append(value)
+        return self.values
+
+
+# ==== Windows
+def window_positions(x0: int, y0: int, x1: int, y1: int) -> np.ndarray:
+    """The memory locations in the window from (x0, y0) to (x1, y1).
+
+    Rows run from y1 down to y0 and columns from x0 to x1, both inclusive,
+    so the window prints the way the spiral is drawn.
+
+    raises:
+      ValueError: if the window is empty.
+    """
+    if x0 > x1 or y0 > y1:
+        raise ValueError("Windows run from (x0, y0) up to (x1, y1).")
+
+    xs = np.arange(x0, x1 + 1, dtype=np.int64)
+    ys = np.arange(y1, y0 - 1, -1, dtype=np.int64)
+    return position_of_many(xs[np.newaxis, :], ys[:, np.newaxis])
+
+
+def window_sums(x0: int, y0: int, x1: int, y1: int,
+                memory: t.Optional['SpiralMemory'] = None) -> np.ndarray:
+    """The neighbor-sum values in the window from (x0, y0) to (x1, y1).
+
+    Memory is only filled in up to the furthest location in the window. The
+    array holds Python ints (dtype object) once values outgrow 64 bits.
+
+    raises:
+      ValueError: if the window is empty.
+    """
+    positions = window_positions(x0, y0, x1, y1)
+    memory = memory if memory is not None else SpiralMemory()
+    memory.fill(int(positions.max()))
+
+    if isinstance(memory.values, array.array):
+        values = np.frombuffer(memory.values, dtype=np.int64)
+    else:
+        values = np.array(memory.values, dtype=object)
+    return values[positions - 1]
 
 
 def sum_walk() -> t.Iterable[int]:
@@ -121,24 +369,83 @@ def sum_walk() -> t.Iterable[int]:
 
     Return the value for each location we visit.
     """
-    location = Coordinate(x=0, y=0)
-    memory = {location: 1}  # Set up basic memory.
+    memory = SpiralMemory()
+    position = 1
+    while True:
+        position += 1
+        yield memory[position]
 
-    for step in path():
-        # Start moving
-        location = location.move(step)
-        # Sum around each location we're at.
-        neighborhood_value = sum_neighborhood(memory, location)
-        memory[location] = neighborhood_value
 
-        yield neighborhood_value
+class SumTable(object):
+    """Neighbor-sum memory, filled in as far as queries need, and optionally
+    kept in a file for other processes to reuse.
 
+    From location 2 onwards each value is larger than the last, so lookups
+    are a bisect of the values so far.
+    """
 
-def sum_bigger_than(puzzle_input) -> int:
+    def __init__(self, path: t.Optional[str] = None) -> None:
+        self.path = path
+        self.memory = SpiralMemory(self._load())
+
+    def __len__(self) -> int:
+        return len(self.memory)
+
+    def first_larger_than(self, value: int) -> int:
+        """The first value in memory, from location 2, larger than `value`."""
+        # Locations 1 and 2 both hold 1, so skip the first.
+        index = bisect.bisect_right(self.memory.values, value, lo=1)
+        while index == len(self.memory):
+            self._grow()
+            index = bisect.bisect_right(self.memory.values, value, lo=index)
+        return self.memory.values[index]
+
+    def save(self) -> None:
+        """Write the table to its file, replacing what was there."""
+        if self.path is None:
+            return
+
+        directory = os.path.dirname(os.path.abspath(self.path))
+        with tempfile.NamedTemporaryFile(
+                'w', dir=directory, delete=False) as table:
+            table.writelines("{}\n".format(value)
+                             for value in self.memory.values)
+        os.replace(table.name, self.path)
+
+    def _load(self) -> t.List[int]:
+        """The values saved to the file so far, or just the first one.
+
+        Missing or corrupt files count as empty.
+        """
+        if self.path is None:
+            return [1]
+
+        try:
+            with open(self.path) as table:
+                values = [int(line) for line in table]
+        except (OSError, ValueError):
+            values = []
+        return values or [1]
+
+    def _grow(self) -> None:
+        """Extend the table - from the file, if another process got further,
+        otherwise by filling in memory and saving it."""
+        saved = self._load()
+        if len(saved) > len(self.memory):
+            self.memory = SpiralMemory(saved)
+            return
+
+        self.memory.fill(2 * len(self.memory) + 8)
+        self.save()
+
+
+_sum_table = SumTable()
+
+
+def sum_bigger_than(puzzle_input: int,
+                    table: t.Optional[SumTable] = None) -> int:
     """Find the first memory contents larger than the `puzzle_input`."""
-    for memory_value in sum_walk():
-        if memory_value > puzzle_input:
-            return memory_value
+    return (table or _sum_table).first_larger_than(puzzle_input)
 
 
 @click.group()
@@ -161,16 +468,62 @@ def pos(position: int) -> None:
     click.secho("Distance walked is: {}".format(location.distance), fg="green")
 
 
+@spiral_walk.command()
+@click.argument('positions', type=click.File())
+@click.option('-o', '--output', type=click.File('w'), default='-',
+              help="Where to write the coordinates. Default: stdout.")
+def batch(positions: t.IO[str], output: t.IO[str]) -> None:
+    """Find a file of positions, one per line.
+
+    Writes the x, y and distance of each, one per line.
+    """
+    try:
+        xs, ys = walk_to_any(positions.read().split())
+    except ValueError as err:
+        raise click.BadParameter(str(err))
+
+    distances = np.abs(xs) + np.abs(ys)
+    for start in range(0, len(xs), OUTPUT_BLOCK):
+        block = slice(start, start + OUTPUT_BLOCK)
+        output.write(''.join(map("{}\t{}\t{}\n".format, xs[block].tolist(),
+                                 ys[block].tolist(),
+                                 distances[block].tolist())))
+
+
+@spiral_walk.command()
+@click.argument('x0', type=int)
+@click.argument('y0', type=int)
+@click.argument('x1', type=int)
+@click.argument('y1', type=int)
+@click.option('--sums', is_flag=True,
+              help="Show neighbor-sum values rather than locations.")
+def window(x0: int, y0: int, x1: int, y1: int, sums: bool) -> None:
+    """Draw the memory locations from (x0, y0) to (x1, y1).
+
+    Put -- before the corners if any of them are negative.
+    """
+    try:
+        grid = (window_sums if sums else window_positions)(x0, y0, x1, y1)
+    except ValueError as err:
+        raise click.BadParameter(str(err))
+
+    width = len(str(grid.max()))
+    for row in grid.tolist():
+        click.echo(' '.join(str(value).rjust(width) for value in row))
+
+
 @spiral_walk.command()
 @click.argument('value', type=int)
-def sum(value: int) -> None:
+@click.option('--table', type=click.Path(dir_okay=False),
+              help="File to keep the neighbor sums in, between runs.")
+def sum(value: int, table: t.Optional[str]) -> None:
     """Get the first value in a neighbor-sum walk larger than `value`."""
     if value < 1:
         msg = "Can't sum our memory values to less than one".format(value)
         click.secho(msg, fg='red')
         return
 
-    first_larger_value = sum_bigger_than(value)
+    first_larger_value = sum_bigger_than(value, SumTable(table))
     msg = "First value larger than {} is: {}".format(value, first_larger_value)
     click.echo(msg)
 
@@ -10,6 +10,9 @@ NOTE: the spiral is 1-indexed.
 """
 import itertools
 
+import numpy as np
+import pytest
+
 import spiral_walk as sw
 
 
@@ -72,3 +75,133 @@ def test_sum_pos_5() -> None:
 def test_sum_larger_than_4() -> None:
     """First value larger than 4 in a location is 5, in location 5."""
     assert sw.sum_bigger_than(4) == 5
+
+
+# ==== Closed form
+def test_walk_to_matches_walking() -> None:
+    """The closed form lands where walking the spiral does."""
+    location = sw.Coordinate(x=0, y=0)
+    steps = itertools.chain([sw.Step(x=0, y=0)], sw.path())
+    for position, step in zip(range(1, 3000), steps):
+        location = location.move(step)
+        assert sw.walk_to(position) == location
+    assert sw.walk_to(1234) == sw.walk_to_iteratively(1234)
+    for position in range(1, 200):
+        assert sw.walk(position - 1) == sw.walk_to_iteratively(position)
+
+
+def test_walk_to_far_away() -> None:
+    """Bottom right corners are odd squares."""
+    assert sw.walk_to(99999 ** 2) == sw.Coordinate(49999, -49999)
+    assert sw.walk_to(10 ** 12).distance == 999999
+
+
+def test_walk_to_before_start() -> None:
+    """There's nothing before square 1."""
+    with pytest.raises(ValueError):
+        sw.walk_to(0)
+
+
+def test_position_of_inverts_walk_to() -> None:
+    """Going to a position and back again."""
+    for position in range(1, 3000):
+        assert sw.position_of(sw.walk_to(position)) == position
+    assert sw.position_of(sw.Coordinate(-2, -2)) == 21
+
+
+def test_many_at_once() -> None:
+    """The array versions agree with one at a time."""
+    positions = np.array([1, 2, 9, 10, 12, 23, 1024, 99999 ** 2, 10 ** 15])
+    xs, ys = sw.walk_to_many(positions)
+    assert [sw.Coordinate(int(x), int(y)) for x, y in zip(xs, ys)] == \
+        [sw.walk_to(int(position)) for position in positions]
+    assert list(sw.position_of_many(xs, ys)) == list(positions)
+
+    huge = ['5', str(10 ** 20), '1024', str(2 ** 63), str(2 ** 63 - 1)]
+    xs, ys = sw.walk_to_any(huge)
+    assert [sw.Coordinate(x, y) for x, y in zip(xs.tolist(), ys.tolist())] == \
+        [sw.walk_to(int(position)) for position in huge]
+    with pytest.raises(ValueError):
+        sw.walk_to_any(['5', str(-10 ** 20)])
+
+    xs, ys = np.meshgrid(np.arange(-30, 31), np.arange(-30, 31))
+    assert sorted(sw.position_of_many(xs, ys).ravel()) == \
+        list(range(1, 61 ** 2 + 1))
+
+
+def test_spiral_memory_matches_walking() -> None:
+    """Flat memory holds the same values as summing Coordinate neighbors,
+    including those too large for 64 bits."""
+    location = sw.Coordinate(x=0, y=0)
+    memory = {location: 1}
+    for step in itertools.islice(sw.path(), 600):
+        location = location.move(step)
+        memory[location] = sw.sum_neighborhood(memory, location)
+
+    spiral_memory = sw.SpiralMemory()
+    for coordinate, value in memory.items():
+        assert spiral_memory[sw.position_of(coordinate)] == value
+    assert isinstance(spiral_memory.values, list)
+
+
+def test_sum_table_lookups() -> None:
+    """Bisecting the table agrees with walking until we pass the value."""
+    table = sw.SumTable()
+    for value in [0, 1, 2, 4, 5, 146, 147, 361527, 10 ** 30]:
+        expected = next(v for v in sw.sum_walk() if v > value)
+        assert table.first_larger_than(value) == expected
+
+
+def test_sum_table_file(tmp_path) -> None:
+    """A table picks up where another one, in the same file, got to."""
+    path = str(tmp_path / 'sums')
+    first = sw.SumTable(path)
+    assert first.first_larger_than(10 ** 12) == sw.sum_bigger_than(10 ** 12)
+
+    second = sw.SumTable(path)
+    assert len(second) == len(first)
+    assert second.first_larger_than(747) == 806
+
+    with open(path, 'w') as table:
+        table.write("1\nnot a number\n")
+    assert len(sw.SumTable(path)) == 1
+
+
+def test_path_segments() -> None:
+    """Runs expand to the step-by-step path, and walking them a side at a
+    time lands where walking a step at a time does."""
+    assert list(itertools.islice(sw.path_segments(), 8)) == [
+        (sw.Right, 1), (sw.Up, 1), (sw.Left, 2), (sw.Down, 2),
+        (sw.Right, 3), (sw.Up, 3), (sw.Left, 4), (sw.Down, 4)]
+
+    location = sw.Coordinate(x=0, y=0)
+    for steps, step in enumerate(itertools.islice(sw.path(), 500), start=1):
+        location = location.move(step)
+        assert sw.walk(steps) == location
+
+
+def test_window_positions() -> None:
+    """The window is laid out the way the spiral is drawn."""
+    assert sw.window_positions(-2, -2, 2, 2).tolist() == [
+        [17, 16, 15, 14, 13],
+        [18, 5, 4, 3, 12],
+        [19, 6, 1, 2, 11],
+        [20, 7, 8, 9, 10],
+        [21, 22, 23, 24, 25]]
+    assert sw.window_positions(1, 0, 1, 0).tolist() == [[2]]
+    with pytest.raises(ValueError):
+        sw.window_positions(1, 0, 0, 0)
+
+
+def test_window_sums() -> None:
+    """Sums come from memory, filled only as far as the window needs."""
+    memory = sw.SpiralMemory()
+    assert sw.window_sums(-1, -1, 1, 1, memory).tolist() == [
+        [5, 4, 2],
+        [10, 1, 1],
+        [11, 23, 25]]
+    assert len(memory) == 9
+
+    big = sw.window_sums(10, 10, 12, 12, memory)
+    assert big.dtype == object
+    assert big[0, 0] == memory[sw.xy_position(10, 12)]
@@ -6,7 +6,14 @@ Each line of our input file contains a pass phrase. For the phrase to be valid
 it must contain no duplicate words. We count how many passphrases in the list
 are valid.
 """
+import array
 import collections
+import concurrent.futures
+import functools
+import itertools
+import mmap
+import os
+import sqlite3
 import typing as t
 
 import click
@@ -14,6 +21,9 @@ import click
 
 CharCount = t.Tuple[t.Tuple[str, int], ...]
 
+# How many distinct words to remember anagram keys for.
+KEY_CACHE_SIZE = 1 << 16
+
 
 # ==== part 1
 def valid_passphrase(passphrase: str) -> bool:
@@ -40,12 +50,34 @@ def freeze(counter: collections.Counter) -> CharCount:
 
 
 def frequency_counter(word: str) -> CharCount:
+    """The letter counts of a word - the reference for anagram_key."""
     return freeze(collections.Counter(word))
 
 
+@functools.lru_cache(maxsize=KEY_CACHE_SIZE)
+def anagram_key(word: str) -> str:
+    """A key that's the same for all anagrams of `word`: its sorted letters.
+
+    Passphrases share a small vocabulary, so keys are cached per word.
+    """
+    return ''.join(sorted(word))
+
+
+def key_cache_stats() -> t.Dict[str, float]:
+    """Hits, misses, size and hit rate of the anagram key cache."""
+    info = anagram_key.cache_info()
+    lookups = info.hits + info.misses
+    return {
+        'hits': info.hits,
+        'misses': info.misses,
+        'size': info.currsize,
+        'hit_rate': info.hits / lookups if lookups else 0.0,
+    }
+
+
 def extra_valid_passphrase(passphrase: str) -> bool:
     """Find if there are no repeated words, or anagrams in this passphrase."""
-    all_words = list(map(frequency_counter, passphrase.split()))
+    all_words = list(map(anagram_key, passphrase.split()))
     return len(all_words) == len(set(all_words))
 
 
@@ -54,6 +86,390 @@ def count_extra_valid_passphrases(passwd_lines: t.List[str]) -> int:
     return len(list(filter(extra_valid_passphrase, passwd_lines)))
 
 
+# ==== Both at once
+# Mask bytes are counted this many at a time.
+COUNT_BLOCK = 1 << 20
+
+# The number of bits set in each byte value.
+_BIT_COUNTS = bytes(bin(value).count('1') for value in range(256))
+
+
+class PassphraseScan(object):
+    """Which passphrases are valid under each policy, one bit per line.
+
+    Line `n` (counting from 1) is bit `(n - 1) % 8` of byte `(n - 1) // 8`
+    in each of the `unique` and `anagram` masks, set when it's valid.
+    """
+
+    def __init__(self) -> None:
+        self.lines = 0
+        self.unique = bytearray()
+        self.anagram = bytearray()
+
+    def __len__(self) -> int:
+        return self.lines
+
+    def add(self, passphrase: str) -> None:
+        """Check one more passphrase against both policies.
+
+        Splits it once; stops at the first repeated word, as that fails both.
+        """
+        unique_valid = anagram_valid = True
+        words = set()  # type: t.Set[str]
+        keys = set()  # type: t.Set[str]
+        for word in passphrase.split():
+            if word in words:
+                unique_valid = anagram_valid = False
+                break
+            words.add(word)
+
+            if anagram_valid:
+                key = anagram_key(word)
+                anagram_valid = key not in keys
+                keys.add(key)
+
+        byte, bit = divmod(self.lines, 8)
+        if not bit:
+            self.unique.append(0)
+            self.anagram.append(0)
+        self.unique[byte] |= unique_valid << bit
+        self.anagram[byte] |= anagram_valid << bit
+        self.lines += 1
+
+    def valid(self, policy: str, line: int) -> bool:
+        """Whether passphrase `line` (from 1) is valid under a policy.
+
+        raises:
+          IndexError: for lines not scanned.
+          KeyError: for unknown policies.
+        """
+        if not 1 <= line <= self.lines:
+            raise IndexError("No line {} in the scan.".format(line))
+        byte, bit = divmod(line - 1, 8)
+        return bool(self._mask(policy)[byte] >> bit & 1)
+
+    def count(self, policy: str) -> int:
+        """How many passphrases are valid under a policy.
+
+        raises:
+          KeyError: for unknown policies.
+        """
+        mask = self._mask(policy)
+        valid = 0
+        for start in range(0, len(mask), COUNT_BLOCK):
+            bit_counts = mask[start:start + COUNT_BLOCK].translate(_BIT_COUNTS)
+            valid += sum(bits * bit_counts.count(bits) for bits in range(1, 9))
+        return valid
+
+    def _mask(self, policy: str) -> bytearray:
+        """The mask for a policy.
+
+        raises:
+          KeyError: for unknown policies.
+        """
+        return {'unique': self.unique, 'anagram': self.anagram}[policy]
+
+
+def scan_passphrases(passwd_lines: t.Iterable[str]) -> PassphraseScan:
+    """Check each passphrase against both policies, in one pass."""
+    scan = PassphraseScan()
+    for passphrase in passwd_lines:
+        scan.add(passphrase)
+    return scan
+
+
+# ==== Interned
+def valid_word_ids(word_ids: t.Sequence[int]) -> bool:
+    """Find if there are no repeated word IDs in this passphrase."""
+    return len(word_ids) == len(set(word_ids))
+
+
+def extra_valid_word_ids(word_ids: t.Sequence[int],
+                         anagram_ids: t.Sequence[int]) -> bool:
+    """Find if there are no repeated word IDs, or IDs of anagrams, in this
+    passphrase - `anagram_ids` giving the anagram key ID of each word ID."""
+    return len(word_ids) == len({anagram_ids[word] for word in word_ids})
+
+
+class Corpus(object):
+    """Passphrases, held as IDs of words in a shared vocabulary.
+
+    Every phrase's word IDs sit end to end in one array('I'); phrase `i` is
+    `words[offsets[i]:offsets[i + 1]]`. Each vocabulary entry also has the ID
+    of its anagram key, so anagram checks never look at letters.
+    """
+
+    def __init__(self) -> None:
+        self.vocabulary = []  # type: t.List[str]
+        self.anagram_ids = array.array('I')
+        self.words = array.array('I')
+        self.offsets = array.array('Q', [0])
+        self._word_ids = {}  # type: t.Dict[str, int]
+        self._key_ids = {}  # type: t.Dict[str, int]
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, phrase: int) -> str:
+        """The text of passphrase `phrase`, with single spaces."""
+        return ' '.join(self.vocabulary[word]
+                        for word in self.word_ids(phrase))
+
+    def add(self, passphrase: str) -> None:
+        """Add a passphrase, interning any words not seen before."""
+        for word in passphrase.split():
+            word_id = self._word_ids.get(word)
+            if word_id is None:
+                word_id = self._word_ids[word] = len(self.vocabulary)
+                self.vocabulary.append(word)
+                self.anagram_ids.append(self._key_ids.setdefault(
+                    anagram_key(word), len(self._key_ids)))
+            self.words.append(word_id)
+        self.offsets.append(len(self.words))
+
+    def word_ids(self, phrase: int) -> t.Sequence[int]:
+        """The word IDs of passphrase `phrase`, counting from 0.
+
+        raises:
+          IndexError: for phrases not in the corpus.
+        """
+        if not 0 <= phrase < len(self):
+            raise IndexError("No passphrase {} in the corpus.".format(phrase))
+        return self.words[self.offsets[phrase]:self.offsets[phrase + 1]]
+
+    def valid(self, policy: str, phrase: int) -> bool:
+        """Whether passphrase `phrase` is valid under a policy.
+
+        raises:
+          IndexError: for phrases not in the corpus.
+          KeyError: for unknown policies.
+        """
+        word_ids = self.word_ids(phrase)
+        if policy == 'unique':
+            return valid_word_ids(word_ids)
+        elif policy == 'anagram':
+            return extra_valid_word_ids(word_ids, self.anagram_ids)
+        raise KeyError("No passphrase policy called {}".format(policy))
+
+    def count(self, policy: str) -> int:
+        """How many passphrases are valid under a policy.
+
+        raises:
+          KeyError: for unknown policies.
+        """
+        return sum(self.valid(policy, phrase) for phrase in range(len(self)))
+
+
+def load_corpus(passwd_lines: t.Iterable[str]) -> Corpus:
+    """Intern a file's worth of passphrases."""
+    corpus = Corpus()
+    for passphrase in passwd_lines:
+        corpus.add(passphrase)
+    return corpus
+
+
+# ==== In parallel
+# Split files into this many ranges per worker, to even out uneven lines.
+RANGES_PER_WORKER = 4
+
+# Start and stop offsets of a run of whole lines in a file.
+ByteRange = t.Tuple[int, int]
+
+POLICIES = {
+    'unique': valid_passphrase,
+    'anagram': extra_valid_passphrase,
+}  # type: t.Dict[str, t.Callable[[str], bool]]
+
+
+def line_aligned_ranges(path: str, parts: int) -> t.List[ByteRange]:
+    """Split a file into about `parts` byte ranges, each of whole lines."""
+    size = os.path.getsize(path)
+    boundaries = [0]
+    with open(path, 'rb') as passwd:
+        for part in range(1, parts):
+            # Move on to the start of the line after the split point.
+            passwd.seek(max(size * part // parts - 1, boundaries[-1]))
+            passwd.readline()
+            if passwd.tell() < size:
+                boundaries.append(passwd.tell())
+    boundaries.append(size)
+
+    return [(start, stop) for start, stop in zip(boundaries, boundaries[1:])
+            if start < stop]
+
+
+def _range_lines(mapped: mmap.mmap,
+                 byte_range: ByteRange) -> t.Iterator[str]:
+    """The lines in a byte range of a mapped file."""
+    start, stop = byte_range
+    mapped.seek(start)
+    while mapped.tell() < stop:
+        yield mapped.readline().decode('utf-8')
+
+
+def check_range(path: str, byte_range: ByteRange, policy: str,
+                list_invalid: bool) -> t.Tuple[int, int, t.List[int]]:
+    """Check the passphrases in a byte range of a file.
+
+    Gives the number of lines, the number of valid passphrases, and - if
+    `list_invalid` - the invalid lines, numbered from 1 within the range.
+    Maps the file itself, so a worker process only gets sent the range.
+
+    raises:
+      KeyError: for unknown policies.
+    """
+    valid = POLICIES[policy]
+    lines = valid_count = 0
+    invalid_lines = []  # type: t.List[int]
+
+    with open(path, 'rb') as passwd, \
+            mmap.mmap(passwd.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        for lines, passphrase in enumerate(
+                _range_lines(mapped, byte_range), start=1):
+            if valid(passphrase):
+                valid_count += 1
+            elif list_invalid:
+                invalid_lines.append(lines)
+
+    return lines, valid_count, invalid_lines
+
+
+def parallel_count(path: str, policy: str = 'unique',
+                   workers: t.Optional[int] = None,
+                   list_invalid: bool = False) -> t.Tuple[int, t.List[int]]:
+    """Count the valid passphrases in a file, split over processes.
+
+    Gives the count, and - if `list_invalid` - the line numbers (from 1) of
+    the invalid passphrases.
+
+    raises:
+      KeyError: for unknown policies.
+    """
+    if policy not in POLICIES:
+        raise KeyError("No passphrase policy called {}".format(policy))
+
+    workers = workers or os.cpu_count() or 1
+    ranges = line_aligned_ranges(path, workers * RANGES_PER_WORKER)
+
+    lines_before = valid_total = 0
+    invalid_lines = []  # type: t.List[int]
+    with concurrent.futures.ProcessPoolExecutor(workers) as pool:
+        for lines, valid_count, range_invalid in pool.map(
+                check_range, itertools.repeat(path), ranges,
+                itertools.repeat(policy), itertools.repeat(list_invalid)):
+            valid_total += valid_count
+            invalid_lines.extend(lines_before + line
+                                 for line in range_invalid)
+            lines_before += lines
+
+    return valid_total, invalid_lines
+
+
+# ==== Across files
+# Passphrases inserted into the index per executemany call.
+INDEX_BATCH = 10000
+
+
+def canonical_phrase(passphrase: str, policy: str = 'unique') -> str:
+    """The key a passphrase is indexed under.
+
+    Its words, single spaced - or, for the anagram policy, the anagram keys
+    of its words; so passphrases differing only by anagrams share a key.
+
+    raises:
+      KeyError: for unknown policies.
+    """
+    words = passphrase.split()
+    if policy == 'unique':
+        return ' '.join(words)
+    elif policy == 'anagram':
+        return ' '.join(map(anagram_key, words))
+    raise KeyError("No passphrase policy called {}".format(policy))
+
+
+class PassphraseIndex(object):
+    """Which files each passphrase appears in, kept in an SQLite database.
+
+    Passphrases are stored under both their canonical keys, so lookups by
+    either policy are a single primary key search.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        self.connection.executescript("""
+            PRAGMA journal_mode = WAL;
+            PRAGMA synchronous = NORMAL;
+            CREATE TABLE IF NOT EXISTS phrases (
+                policy TEXT NOT NULL,
+                phrase TEXT NOT NULL,
+                source TEXT NOT NULL,
+                PRIMARY KEY (policy, phrase, source)
+            ) WITHOUT ROWID;
+        """)
+
+    def __enter__(self) -> 'PassphraseIndex':
+        return self
+
+    def __exit__(self, *exc_info: t.Any) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self.connection.close()
+
+    def add(self, source: str, passwd_lines: t.Iterable[str],
+            batch_size: int = INDEX_BATCH) -> None:
+        """Index the passphrases from `source`, `batch_size` at a time."""
+        rows = ((policy, canonical_phrase(passphrase, policy), source)
+                for passphrase in passwd_lines if passphrase.strip()
+                for policy in sorted(POLICIES))
+        with self.connection:
+            while True:
+                batch = list(itertools.islice(
+                    rows, batch_size * len(POLICIES)))
+                if not batch:
+                    break
+                self.connection.executemany(
+                    "INSERT OR IGNORE INTO phrases VALUES (?, ?, ?)", batch)
+
+    def add_file(self, path: str, batch_size: int = INDEX_BATCH) -> None:
+        """Index the passphrases in the file at `path`."""
+        with open(path) as passwd:
+            self.add(path, passwd, batch_size)
+
+    def sources(self, passphrase: str, policy: str = 'unique') -> t.List[str]:
+        """The files a passphrase has been seen in, under a policy.
+
+        raises:
+          KeyError: for unknown policies.
+        """
+        return [source for source, in self.connection.execute(
+            "SELECT source FROM phrases WHERE policy = ? AND phrase = ?",
+            (policy, canonical_phrase(passphrase, policy)))]
+
+    def seen(self, passphrase: str, policy: str = 'unique') -> bool:
+        """Whether a passphrase has been seen before, under a policy.
+
+        raises:
+          KeyError: for unknown policies.
+        """
+        return self.connection.execute(
+            "SELECT 1 FROM phrases WHERE policy = ? AND phrase = ? LIMIT 1",
+            (policy, canonical_phrase(passphrase, policy))).fetchone() \
+            is not None
+
+    def shared(self, policy: str = 'unique') -> t.Iterator[
+            t.Tuple[str, t.List[str]]]:
+        """Canonical passphrases found in more than one file, with the files.
+        """
+        rows = self.connection.execute(
+            """SELECT phrase, group_concat(source, char(0)) FROM phrases
+               WHERE policy = ? GROUP BY phrase HAVING count(*) > 1""",
+            (policy,))
+        for phrase, sources in rows:
+            yield phrase, sorted(sources.split('\0'))
+
+
 @click.group()
 def passphrases() -> None:
     """Work with Santa's passphrase list. How did we get it?"""
@@ -69,9 +485,63 @@ def count(passwd: t.IO[str]) -> None:
 
 @passphrases.command()
 @click.argument('passwd', type=click.File())
-def count_paranoidly(passwd: t.IO[str]) -> None:
+@click.option('--stats', is_flag=True,
+              help="Report how often anagram keys came from the cache.")
+def count_paranoidly(passwd: t.IO[str], stats: bool) -> None:
     """Each row contains space-deliminated words in a pass phrase."""
     click.echo(str(count_extra_valid_passphrases(passwd)))
+    if stats:
+        msg = "Key cache: {hits} hits, {misses} misses, {hit_rate:.1%}"
+        click.echo(msg.format(**key_cache_stats()), err=True)
+
+
+@passphrases.command()
+@click.argument('passwd', type=click.File())
+def both(passwd: t.IO[str]) -> None:
+    """Count valid passphrases under both policies, reading the file once."""
+    scan = scan_passphrases(passwd)
+    click.echo("No repeated words: {}".format(scan.count('unique')))
+    click.echo("No anagrams: {}".format(scan.count('anagram')))
+
+
+@passphrases.command()
+@click.argument('passwd', type=click.Path(exists=True, dir_okay=False))
+@click.option('--policy', type=click.Choice(sorted(POLICIES)),
+              default='unique', help="No repeated words, or no anagrams.")
+@click.option('-w', '--workers', type=int,
+              help="Processes to use. Default: one per CPU.")
+@click.option('--invalid', is_flag=True,
+              help="Also list the line numbers of invalid passphrases.")
+def parallel(passwd: str, policy: str, workers: t.Optional[int],
+             invalid: bool) -> None:
+    """Count valid passphrases, with the file split between processes."""
+    valid_count, invalid_lines = parallel_count(passwd, policy, workers,
+                                                invalid)
+    click.echo(str(valid_count))
+    for line in invalid_lines:
+        click.echo("Invalid: line {}".format(line))
+
+
+@passphrases.command()
+@click.argument('index', type=click.Path(dir_okay=False))
+@click.argument('passwds', nargs=-1,
+                type=click.Path(exists=True, dir_okay=False))
+def index(index: str, passwds: t.Tuple[str, ...]) -> None:
+    """Add passphrase files to an index, kept in the file INDEX."""
+    with PassphraseIndex(index) as passphrase_index:
+        for passwd in passwds:
+            passphrase_index.add_file(passwd)
+
+
+@passphrases.command()
+@click.argument('index', type=click.Path(exists=True, dir_okay=False))
+@click.option('--policy', type=click.Choice(sorted(POLICIES)),
+              default='unique', help="Match exact words, or anagrams.")
+def shared(index: str, policy: str) -> None:
+    """List passphrases in the index that are in more than one file."""
+    with PassphraseIndex(index) as passphrase_index:
+        for phrase, sources in passphrase_index.shared(policy):
+            click.echo("{}\t{}".format(phrase, ' '.join(sources)))
 
 
 def main() -> None:
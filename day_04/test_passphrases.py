@@ -53,3 +53,94 @@ def test_count_extra_valid_passphrases() -> None:
     passwd = io.StringIO(passwd_file)
     assert passphrases.count_extra_valid_passphrases(passwd) == 0
 
+
+def test_anagram_key() -> None:
+    """Words share a key exactly when they share letter counts."""
+    words = ["abcde", "ecdab", "abcd", "abcdd", "iiii", "oiii", "", "a"]
+    for first in words:
+        for second in words:
+            same_counts = (passphrases.frequency_counter(first) ==
+                           passphrases.frequency_counter(second))
+            same_keys = (passphrases.anagram_key(first) ==
+                         passphrases.anagram_key(second))
+            assert same_counts == same_keys
+
+
+def test_key_cache_stats() -> None:
+    """Repeated words are answered from the cache."""
+    passphrases.anagram_key.cache_clear()
+    passphrases.extra_valid_passphrase("oiii ioii iioi iiio")
+    stats = passphrases.key_cache_stats()
+    assert (stats['hits'], stats['misses'], stats['size']) == (0, 4, 4)
+
+    passphrases.extra_valid_passphrase("iiio oiii")
+    stats = passphrases.key_cache_stats()
+    assert (stats['hits'], stats['misses']) == (2, 4)
+    assert stats['hit_rate'] == 2 / 6
+
+
+def test_parallel_count(tmp_path) -> None:
+    """Counts and invalid line numbers match checking line by line."""
+    lines = ["aa bb cc", "aa bb aa", "ab ba", "abc de", "x", "ab cd ab"] * 7
+    path = tmp_path / 'passwd'
+    path.write_text('\n'.join(lines))
+
+    for policy, valid in passphrases.POLICIES.items():
+        expected_invalid = [number for number, line
+                            in enumerate(lines, start=1) if not valid(line)]
+        assert passphrases.parallel_count(
+            str(path), policy, workers=2, list_invalid=True) == (
+                len(lines) - len(expected_invalid), expected_invalid)
+    assert passphrases.parallel_count(str(path), workers=2) == (28, [])
+
+
+def test_scan_passphrases(monkeypatch) -> None:
+    """One pass agrees with checking each policy separately."""
+    monkeypatch.setattr(passphrases, 'COUNT_BLOCK', 3)
+    lines = ["aa bb cc", "aa bb aa", "ab ba", "abc de", "x", "ab cd ab",
+             "", "ba ab ab", "oiii ioii"] * 3
+    scan = passphrases.scan_passphrases(lines)
+    assert len(scan) == len(lines)
+    assert len(scan.unique) == len(scan.anagram) == 4
+
+    for policy, valid in passphrases.POLICIES.items():
+        assert scan.count(policy) == sum(map(valid, lines))
+        for number, line in enumerate(lines, start=1):
+            assert scan.valid(policy, number) is valid(line)
+
+
+def test_corpus() -> None:
+    """Checks on interned word IDs agree with checks on the text."""
+    lines = ["aa bb cc", "aa bb aa", "ab ba", "abc de", "x", "ab cd ab",
+             "", "ba ab ab", "oiii ioii"] * 3
+    corpus = passphrases.load_corpus(io.StringIO('\n'.join(lines)))
+    assert len(corpus) == len(lines)
+    assert len(corpus.vocabulary) == 11
+    assert len(set(corpus.anagram_ids)) == 9
+    assert corpus[1] == "aa bb aa"
+
+    for policy, valid in passphrases.POLICIES.items():
+        assert corpus.count(policy) == sum(map(valid, lines))
+        for phrase, line in enumerate(lines):
+            assert corpus.valid(policy, phrase) is valid(line)
+
+
+def test_passphrase_index(tmp_path) -> None:
+    """The index finds passphrases shared between files, exactly or by
+    anagram, and remembers them between connections."""
+    path = str(tmp_path / 'index.db')
+    with passphrases.PassphraseIndex(path) as index:
+        index.add('first', ["aa bb", "abc de", "", "x y"], batch_size=1)
+        index.add('second', ["aa  bb", "cba ed", "x y"])
+
+    with passphrases.PassphraseIndex(path) as index:
+        assert index.seen("aa bb")
+        assert not index.seen("bb aa")
+        assert not index.seen("bca de")
+        assert index.seen("bca de", 'anagram')
+        assert index.sources("cba ed") == ['second']
+        assert list(index.shared()) == [
+            ("aa bb", ['first', 'second']), ("x y", ['first', 'second'])]
+        assert list(index.shared('anagram')) == [
+            ("aa bb", ['first', 'second']), ("abc de", ['first', 'second']),
+            ("x y", ['first', 'second'])]
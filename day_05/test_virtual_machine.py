@@ -1,4 +1,6 @@
 """Haven't tested the von Santa machine. Only a madman would try."""
+import typing as t
+
 import pytest
 
 import virtual_machine as v
@@ -74,3 +76,38 @@ def test_inc_jump_segfault() -> None:
 
     with pytest.raises(v.SegFault):
         vm.step()
+
+
+@pytest.mark.parametrize('von_santa', [False, True])
+@pytest.mark.parametrize('program', [
+    [0, 3, 0, 1, -3, 2, -4, 1, 0, -6],
+    [1, -2, 5],
+    [4, 0, 0, -1, -5],
+    [3],
+    [1, 1, 1],
+    [2, 5, 1],
+    [-10 ** 9],
+    [10 ** 9],
+    [2, 0, -10 ** 9, 10 ** 9],
+    [1, 10 ** 9, 0],
+])
+def test_run_matches_stepping(program: t.List[int], von_santa: bool) -> None:
+    """Running to the end - off either end - leaves the machine as stepping
+    there does."""
+    stepped = v.Machine.load(list(program), von_santa_machine=von_santa)
+    while stepped.in_bounds:
+        stepped.step()
+
+    ran = v.Machine.load(list(program), von_santa_machine=von_santa).run()
+    assert ran == stepped
+
+    with pytest.raises(v.SegFault):
+        ran.run()
+
+
+def test_run_example() -> None:
+    """The example escapes in 5 steps, or 10 on a von Santa machine."""
+    assert v.Machine.load([0, 3, 0, 1, -3]).run().instruction_count == 5
+    von_santa = v.Machine.load([0, 3, 0, 1, -3], von_santa_machine=True)
+    assert von_santa.run().memory == [2, 3, 2, 3, -1]
+    assert von_santa.instruction_count == 10
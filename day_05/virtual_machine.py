@@ -2,6 +2,7 @@
 # coding: utf-8
 """
 """
+import itertools
 import typing as t
 
 import attr
@@ -61,6 +62,123 @@ class Machine(object):
 
         return self
 
+    def run(self) -> 'Machine':
+        """Step until the program counter leaves memory.
+
+        Runs the same jumps as step, in a loop kept to local variables; the
+        machine is only updated when the loop stops.
+
+        raises:
+          SegFault: if the program counter starts outside memory.
+        """
+        if not self.in_bounds:
+            msg = f"Invalid jump from location {self.program_counter}."
+            raise SegFault(msg)
+
+        engine = _run_von_santa if self.von_santa_machine else _run_rovaniemi
+        engine(self)
+        return self
+
+
+# ==== Engines
+# One loop per architecture, so the inner loop never checks which it is.
+# Loops run on a copy of memory with a None in front for every location a
+# jump could land on below 0. Jumping off the end raises IndexError, and
+# landing on a None raises TypeError, so no step checks the bounds.
+#
+# Offsets of len(memory) or more either way escape the first time they're
+# taken. They're clamped to just that far - and never move afterwards - so
+# the padding, and the von Santa table, stay the size of memory; the
+# real offsets are put back when the loop stops.
+class _Prepared(object):
+    """A machine's memory, padded and clamped for an engine loop."""
+
+    def __init__(self, memory: t.List[int]) -> None:
+        size = len(memory)
+        # Clamping to at least 3 keeps von Santa moving offsets the same way.
+        self.lowest, self.highest = -size, max(size, 3)
+        self.far = {location: jmp_offset
+                    for location, jmp_offset in enumerate(memory)
+                    if not self.lowest <= jmp_offset <= self.highest}
+
+        clamped = list(memory)
+        for location, jmp_offset in self.far.items():
+            clamped[location] = self.clamp(jmp_offset)
+        self.padding = max(0, -min(clamped))
+        self.memory = [None] * self.padding + clamped  # type: t.List[t.Any]
+
+    def clamp(self, jmp_offset: int) -> int:
+        return min(max(jmp_offset, self.lowest), self.highest)
+
+    def write_back(self, machine: Machine, program_counter: int,
+                   count: int) -> None:
+        """Update the machine with where the loop stopped."""
+        memory = self.memory[self.padding:]
+        program_counter -= self.padding
+        for location, jmp_offset in self.far.items():
+            clamped = self.clamp(jmp_offset)
+            if memory[location] != clamped:
+                # Taken, so this was the last jump - and it went further.
+                program_counter += jmp_offset - clamped
+            memory[location] += jmp_offset - clamped
+
+        machine.memory[:] = memory
+        machine.program_counter = program_counter
+        machine.instruction_count += count
+
+
+def _run_rovaniemi(machine: Machine) -> None:
+    """Run a Rovaniemi machine until it escapes memory.
+
+    Every jump adds one to memory, so rather than being counted in the
+    loop, the jumps are the difference in its total.
+    """
+    prepared = _Prepared(machine.memory)
+    memory = prepared.memory
+    before = sum(machine.memory)
+    program_counter = machine.program_counter + prepared.padding
+    try:
+        while True:
+            jmp_offset = memory[program_counter]
+            memory[program_counter] = jmp_offset + 1
+            program_counter += jmp_offset
+            jmp_offset = memory[program_counter]
+            memory[program_counter] = jmp_offset + 1
+            program_counter += jmp_offset
+    except (IndexError, TypeError):
+        pass
+    finally:
+        prepared.write_back(machine, program_counter, 0)
+        machine.instruction_count += sum(machine.memory) - before
+
+
+def _run_von_santa(machine: Machine) -> None:
+    """Run a von Santa machine until it escapes memory.
+
+    Offsets only move towards 2 and 3, so once clamped they stay within
+    the prepared bounds; the new value for each is looked up, rather than
+    worked out, with negative offsets counting back from the end of the
+    table - past all the positive ones.
+    """
+    prepared = _Prepared(machine.memory)
+    next_offset = [0] * (prepared.highest - prepared.lowest + 1)
+    for jmp_offset in range(prepared.lowest, prepared.highest + 1):
+        next_offset[jmp_offset] = (jmp_offset - 1 if jmp_offset >= 3
+                                   else jmp_offset + 1)
+
+    memory = prepared.memory
+    program_counter = machine.program_counter + prepared.padding
+    count = 0
+    try:
+        for count in itertools.count():
+            jmp_offset = memory[program_counter]
+            memory[program_counter] = next_offset[jmp_offset]
+            program_counter += jmp_offset
+    except (IndexError, TypeError):
+        pass
+    finally:
+        prepared.write_back(machine, program_counter, count)
+
 
 def read_program(program: t.IO[str]) -> t.List[int]:
     return list(map(int, program.readlines()))
@@ -70,11 +188,7 @@ def run_program(program: t.IO[str], von_santa=False) -> int:
     """ """
     memory = read_program(program)
     machine = Machine.load(memory, von_santa_machine=von_santa)
-
-    while machine.in_bounds:
-        machine.step()
-
-    return machine.instruction_count
+    return machine.run().instruction_count
 
 
 @click.group()